@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CreateOrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'create_orders'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Sum, When
+from ordering_goods.cache import bump_catalog_version
+from ordering_goods.importer import refresh_catalog
+from ordering_goods.models import ProductInfo
+from .models import Order, OrderItem
+from .totals import snapshot_prices, update_totals
+
+
+class OutOfStock(Exception):
+
+    def __init__(self, shortfall):
+        super().__init__('Недостаточно товара на складе')
+        self.shortfall = shortfall
+
+
+def change_stock(quantities, reserve=True):
+    """
+    Изменяет остатки ProductInfo на {id: количество}. Строки блокируются в порядке id,
+    поэтому встречные оформления заказов не взаимоблокируются, затем все остатки
+    меняются одним UPDATE. При резервировании нехватка хотя бы одной позиции поднимает OutOfStock.
+    """
+    if not quantities:
+        return
+    locked = {product_info_id: (quantity, shop_id) for product_info_id, quantity, shop_id in
+              ProductInfo.objects.select_for_update().filter(id__in=list(quantities)).order_by('id').values_list(
+                  'id', 'quantity', 'shop_id')}
+    if reserve:
+        shortfall = [{'product_info': product_info_id, 'requested': quantity,
+                      'available': locked[product_info_id][0] if product_info_id in locked else 0}
+                     for product_info_id, quantity in sorted(quantities.items())
+                     if product_info_id not in locked or locked[product_info_id][0] < quantity]
+        if shortfall:
+            raise OutOfStock(shortfall)
+    sign = -1 if reserve else 1
+    ProductInfo.objects.filter(id__in=list(locked)).update(quantity=Case(
+        *[When(id=product_info_id, then=F('quantity') + sign * quantity)
+          for product_info_id, quantity in quantities.items() if product_info_id in locked],
+        default=F('quantity'), output_field=PositiveIntegerField()))
+    refresh_catalog(list(locked))
+    for shop_id in {shop_id for _, shop_id in locked.values()}:
+        bump_catalog_version(shop_id, catalog=False)
+
+
+def place_order(user_id, order_id, contact_id):
+    """
+    Оформляет корзину пользователя в заказ, списывая остатки и фиксируя цены позиций.
+    Возвращает None, если корзины нет.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(user_id=user_id, id=order_id, state='basket').first()
+        if order is None:
+            return None
+        change_stock(dict(OrderItem.objects.filter(order_id=order.id).values_list('product_info_id', 'quantity')))
+        snapshot_prices(OrderItem.objects.filter(order_id=order.id))
+        update_totals([order.id])
+        order.contact_id = contact_id
+        order.state = 'new'
+        order.save(update_fields=['contact', 'state', 'updated_at'])
+    return order
+
+
+def release_stock(order_ids):
+    change_stock(dict(OrderItem.objects.filter(order_id__in=order_ids).values('product_info_id').annotate(
+        total=Sum('quantity')).values_list('product_info_id', 'total')), reserve=False)
@@ -0,0 +1,59 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .inventory import release_stock
+from .models import Order, OrderItem, OrderStateTransition
+from .tasks import order_state_email
+
+
+TRANSITIONS = {
+    'new': ('confirmed', 'canceled'),
+    'confirmed': ('assembled', 'canceled'),
+    'assembled': ('sent', 'canceled'),
+    'sent': ('delivered',),
+}
+
+TARGET_STATES = ('confirmed', 'assembled', 'sent', 'delivered', 'canceled')
+
+
+def source_states(state):
+    return [source for source, targets in TRANSITIONS.items() if state in targets]
+
+
+def transition_orders(order_ids, state, user_id=None, shop_user_id=None, customer_id=None):
+    """
+    Переводит заказы order_ids в статус state. Переводятся только заказы, из статуса которых
+    такой переход допустим, для shop_user_id - только состоящие целиком из позиций его магазина,
+    для customer_id - только его собственные. Все заказы меняются одним UPDATE, история
+    пишется одним INSERT, при отмене возвращаются остатки, а после коммита покупателям
+    уходит по одному письму на всех их заказах. Возвращает id переведённых заказов.
+    """
+    orders = Order.objects.filter(id__in=order_ids, state__in=source_states(state))
+    if shop_user_id is not None:
+        items = OrderItem.objects.filter(order_id=OuterRef('id'))
+        orders = orders.filter(Exists(items.filter(product_info__shop__user_id=shop_user_id)),
+                               ~Exists(items.exclude(product_info__shop__user_id=shop_user_id)))
+    if customer_id is not None:
+        orders = orders.filter(user_id=customer_id)
+    with transaction.atomic():
+        changed = list(orders.select_for_update().order_by('id').values_list('id', 'state', 'user_id'))
+        if not changed:
+            return []
+        ids = [order_id for order_id, _, _ in changed]
+        Order.objects.filter(id__in=ids, state__in=source_states(state)).update(
+            state=state, updated_at=timezone.now())
+        OrderStateTransition.objects.bulk_create([
+            OrderStateTransition(order_id=order_id, from_state=from_state, to_state=state, user_id=user_id)
+            for order_id, from_state, _ in changed])
+        if state == 'canceled':
+            release_stock(ids)
+        notifications = defaultdict(list)
+        for order_id, _, customer in changed:
+            notifications[customer].append(order_id)
+        transaction.on_commit(lambda: order_state_email.delay(list(notifications.items()), state))
+    return ids
+
+
+def cancel_order(user_id, order_id):
+    return len(transition_orders([order_id], 'canceled', user_id=user_id, customer_id=user_id))
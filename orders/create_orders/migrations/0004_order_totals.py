@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:49
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    Order = apps.get_model('create_orders', 'Order')
+    OrderItem = apps.get_model('create_orders', 'OrderItem')
+    ProductInfo = apps.get_model('ordering_goods', 'ProductInfo')
+    OrderItem.objects.update(price=Subquery(ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price')))
+    items = OrderItem.objects.filter(order_id=OuterRef('id')).order_by().values('order_id')
+    Order.objects.update(
+        total_sum=Coalesce(Subquery(items.annotate(total=Sum(F('quantity') * F('price'))).values('total')),
+                           Value(0)),
+        items_count=Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_orders', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество позиций'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма заказа'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Цена'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
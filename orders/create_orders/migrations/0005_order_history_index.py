@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_orders', '0004_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-id'], name='order_user_history_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:05
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    Order = apps.get_model('create_orders', 'Order')
+    Order.objects.update(updated_at=F('creating_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_orders', '0005_order_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now,
+                                       verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at', 'id'], name='order_updated_idx'),
+        ),
+    ]
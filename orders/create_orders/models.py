@@ -37,14 +37,19 @@ class Order(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь', related_name='orders',
                              blank=True, on_delete=models.CASCADE)
     creating_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name='Дата изменения', auto_now=True)
     state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
     contact = models.ForeignKey(Contact, verbose_name='Контакт', blank=True,
                                 null=True, on_delete=models.CASCADE)
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма заказа', default=0)
+    items_count = models.PositiveIntegerField(verbose_name='Количество позиций', default=0)
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Список заказов'
         ordering = ('-creating_date',)
+        indexes = [models.Index(fields=['user', '-id'], name='order_user_history_idx'),
+                   models.Index(fields=['updated_at', 'id'], name='order_updated_idx'),]
 
     def __str__(self):
         return str(self.creating_date)
@@ -56,8 +61,23 @@ class OrderItem(models.Model):
     product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='ordered_items',
                                      blank=True, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Заказанная позиция'
         verbose_name_plural = 'Список заказанных позиций'
-        constraints = [models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),]
\ No newline at end of file
+        constraints = [models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),]
+
+
+class OrderStateTransition(models.Model):
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='transitions', on_delete=models.CASCADE)
+    from_state = models.CharField(verbose_name='Прежний статус', choices=STATE_CHOICES, max_length=15)
+    to_state = models.CharField(verbose_name='Новый статус', choices=STATE_CHOICES, max_length=15)
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='order_transitions',
+                             blank=True, null=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(verbose_name='Дата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Смена статуса заказа'
+        verbose_name_plural = 'История статусов заказов'
+        ordering = ('id',)
@@ -0,0 +1,73 @@
+from base64 import b64decode, b64encode
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrderHistoryPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+
+
+class PartnerFeedPagination(BasePagination):
+    """
+    Keyset-пагинация ленты заказов по (updated_at, id). В cursor возвращается позиция
+    последнего отданного заказа, её передают в since следующего запроса, и лента продолжается
+    только изменёнными после неё заказами.
+    updated_at ставится при записи, а виден заказ становится только после коммита, поэтому
+    транзакция с более ранним updated_at может закоммититься уже после того, как курсор ушёл дальше.
+    Чтобы такие заказы не терялись, лента отдаёт только заказы, изменённые раньше чем
+    PARTNER_FEED_DELAY секунд назад: задержка должна быть больше самой долгой транзакции,
+    меняющей заказы, и на столько же свежие изменения появляются в ленте позже.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'since'
+
+    def decode_cursor(self, cursor):
+        try:
+            updated_at, order_id = b64decode(cursor.encode(), altchars=b'-_').decode().split('|')
+            return datetime.fromisoformat(updated_at), int(order_id)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('Неверный курсор')
+
+    def encode_cursor(self, order):
+        return b64encode(f'{order.updated_at.isoformat()}|{order.id}'.encode(), altchars=b'-_').decode()
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor = request.query_params.get(self.cursor_query_param)
+        queryset = queryset.filter(updated_at__lt=timezone.now() - timedelta(seconds=settings.PARTNER_FEED_DELAY))
+        if self.cursor:
+            updated_at, order_id = self.decode_cursor(self.cursor)
+            queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=order_id))
+        page_size = self.get_page_size(request)
+        page = list(queryset.order_by('updated_at', 'id')[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        if page:
+            self.cursor = self.encode_cursor(page[-1])
+        return page
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.has_next:
+            next_url = replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.cursor)
+        return Response({'cursor': self.cursor, 'next': next_url, 'results': data})
@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from create_orders.models import OrderItem
 from users_auth.serializers import ContactSerializer
-from create_orders.models import Order
+from create_orders.models import Order, STATE_CHOICES
 from ordering_goods.serializers import ProductInfoSerializer
+from create_orders.lifecycle import TARGET_STATES
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -16,17 +17,71 @@ class OrderItemSerializer(serializers.ModelSerializer):
         }
 
 
+class BasketItemSerializer(serializers.Serializer):
+    product_info = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BasketItemUpdateSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class OrderItemCreateSerializer(OrderItemSerializer):
     product_info = ProductInfoSerializer(read_only=True)
 
+    class Meta(OrderItemSerializer.Meta):
+        fields = ('id', 'product_info', 'quantity', 'price', 'order', )
+
 
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
 
-    total_sum = serializers.IntegerField()
     contact = ContactSerializer(read_only=True)
 
     class Meta:
         model = Order
-        fields = ('id', 'ordered_items', 'state', 'creating_date', 'total_sum', 'contact', )
-        read_only_fields = ('id', )
\ No newline at end of file
+        fields = ('id', 'ordered_items', 'state', 'creating_date', 'total_sum', 'items_count', 'contact', )
+        read_only_fields = ('id', )
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Order
+        fields = ('id', 'state', 'creating_date', 'total_sum', 'items_count', )
+        read_only_fields = fields
+
+
+class OrderHistoryFilterSerializer(serializers.Serializer):
+    state = serializers.ChoiceField(choices=[choice for choice in STATE_CHOICES if choice[0] != 'basket'],
+                                    required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+
+class PartnerOrderItemSerializer(serializers.ModelSerializer):
+    external_id = serializers.IntegerField(source='product_info.external_id', read_only=True)
+    model = serializers.CharField(source='product_info.model', read_only=True)
+    product = serializers.CharField(source='product_info.product.name', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'product_info', 'external_id', 'model', 'product', 'quantity', 'price', )
+        read_only_fields = fields
+
+
+class PartnerOrderSerializer(serializers.ModelSerializer):
+    ordered_items = PartnerOrderItemSerializer(read_only=True, many=True)
+
+    contact = ContactSerializer(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'state', 'creating_date', 'updated_at', 'ordered_items', 'contact', )
+        read_only_fields = fields
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    orders = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=5000)
+    state = serializers.ChoiceField(choices=TARGET_STATES)
@@ -1,5 +1,8 @@
 from django.dispatch import Signal, receiver
+from ordering_goods.signals import price_list_imported
+from .models import OrderItem
 from .tasks import new_order_confirm_email
+from .totals import snapshot_prices, update_totals
 
 
 order_is_created = Signal()
@@ -7,4 +10,19 @@ order_is_created = Signal()
 
 @receiver(order_is_created)
 def new_order(user_id, order_id, **kwargs):
-    new_order_confirm_email.delay(user_id=user_id, order_id=order_id)
\ No newline at end of file
+    new_order_confirm_email.delay(user_id=user_id, order_id=order_id)
+
+
+@receiver(price_list_imported)
+def reprice_baskets(shop_id, summary=None, **kwargs):
+    """
+    Переносит новые цены магазина в корзины и пересчитывает корзины из summary['baskets'],
+    потерявшие строки удалённых импортом товаров.
+    """
+    items = OrderItem.objects.filter(order__state='basket', product_info__shop_id=shop_id)
+    order_ids = set(items.values_list('order_id', flat=True))
+    if summary:
+        order_ids.update(summary.get('baskets', ()))
+    if order_ids:
+        snapshot_prices(items)
+        update_totals(order_ids)
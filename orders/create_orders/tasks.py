@@ -1,16 +1,30 @@
 from orders.celery import app
-from django.core.mail import EmailMultiAlternatives
+from mailing.tasks import queue_email, queue_emails
 from django.conf import settings
 from users_auth.models import User
+from .models import STATE_CHOICES
 
 
 @app.task
 def new_order_confirm_email(user_id, order_id, **kwargs):
     user = User.objects.get(id=user_id)
-    msg = EmailMultiAlternatives(
+    queue_email(
         f'Статус заказа id{order_id} обновлен',
         f'Заказ id{order_id} сформирован',
-        settings.EMAIL_HOST_USER,
-        [user.email]
+        [user.email],
+        settings.EMAIL_HOST_USER
     )
-    msg.send()
\ No newline at end of file
+
+
+@app.task
+def order_state_email(notifications, state, **kwargs):
+    """
+    Одно письмо каждому пользователю со всеми его заказами, перешедшими в статус state.
+    """
+    users = User.objects.in_bulk([user_id for user_id, _ in notifications])
+    state_name = dict(STATE_CHOICES)[state]
+    queue_emails([(
+        'Статус заказов обновлен',
+        '\n'.join(f'Заказ id{order_id}: {state_name}' for order_id in order_ids),
+        [users[user_id].email]
+    ) for user_id, order_ids in notifications if user_id in users], settings.EMAIL_HOST_USER)
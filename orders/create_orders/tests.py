@@ -1,11 +1,24 @@
+import threading
+from datetime import date, timedelta
+from django.core import mail
 from django.urls import reverse
+from django.utils import timezone
+from django.db import connection
 from django.db.models import Q, F, Sum
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from django.test import TransactionTestCase
 from rest_framework.test import APITestCase
 from rest_framework.authtoken.models import Token
 from create_orders.views import *
 from create_orders.models import *
+from ordering_goods.cache import get_versions
+from ordering_goods.importer import PriceImporter
+from ordering_goods.models import Category, CatalogItem, Product, Shop
+from ordering_goods.signals import price_list_imported
 from ordering_goods.tasks import price_loader
+from create_orders.inventory import OutOfStock, place_order
+from create_orders.lifecycle import cancel_order
 import ujson
 
 
@@ -110,7 +123,179 @@ class TestViews(TestSetUP):
         prices = [int(item['price']) for item in ProductInfo.objects.filter(id=9).values('price')]
         resp_get = self.client.get(self.order_url, headers={'Authorization': f'Token {self.auth_token}'}, format='json')
         self.assertEqual(resp_get.status_code, status.HTTP_200_OK)
-        self.assertEqual(sum([a * b for a, b in zip(quantities, prices)]), resp_get.data[0].get('total_sum'))
+        self.assertEqual(sum([a * b for a, b in zip(quantities, prices)]), resp_get.data['results'][0].get('total_sum'))
+
+    def test_order_history(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        contact = Contact.objects.create(user_id=self.user.id, **self.contacts_data)
+        orders = [Order.objects.create(user_id=self.user.id, state=state, contact=contact, total_sum=100, items_count=1)
+                  for state in ('new', 'delivered', 'new', 'canceled', 'basket')]
+        OrderItem.objects.create(order=orders[0], product_info_id=ProductInfo.objects.order_by('id')[0].id,
+                                 quantity=1, price=100)
+        Order.objects.filter(id=orders[1].id).update(creating_date=timezone.now() - timedelta(days=10))
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.order_url, data={'page_size': 2}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in resp.data['results']], [orders[3].id, orders[2].id])
+        self.assertEqual(set(resp.data['results'][0]), {'id', 'state', 'creating_date', 'total_sum', 'items_count'})
+        self.assertFalse([query for query in queries if 'create_orders_orderitem' in query['sql']])
+        resp = self.client.get(resp.data['next'], headers=headers)
+        self.assertEqual([order['id'] for order in resp.data['results']], [orders[1].id, orders[0].id])
+
+        resp = self.client.get(self.order_url, data={'state': 'new'}, headers=headers)
+        self.assertEqual([order['id'] for order in resp.data['results']], [orders[2].id, orders[0].id])
+        today = date.today()
+        resp = self.client.get(self.order_url, data={'date_to': today - timedelta(days=1)}, headers=headers)
+        self.assertEqual([order['id'] for order in resp.data['results']], [orders[1].id])
+        resp = self.client.get(self.order_url, data={'date_from': today, 'date_to': today}, headers=headers)
+        self.assertEqual(len(resp.data['results']), 3)
+        resp = self.client.get(self.order_url, data={'state': 'basket'}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(reverse('order_detail', args=[orders[0].id]), headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['ordered_items']), 1)
+        resp = self.client.get(reverse('order_detail', args=[orders[4].id]), headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_order_totals(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        first, second = ProductInfo.objects.order_by('id')[:2]
+        self.client.post(self.basket_url, data={'items': ujson.dumps(
+            [{'product_info': first.id, 'quantity': 2}, {'product_info': second.id, 'quantity': 1}])}, headers=headers)
+        basket = Order.objects.get(user_id=self.user.id, state='basket')
+        self.assertEqual((basket.total_sum, basket.items_count), (first.price * 2 + second.price, 2))
+
+        ProductInfo.objects.filter(id=first.id).update(price=first.price + 1000)
+        price_list_imported.send(sender=self.__class__, shop_id=first.shop_id, summary={})
+        basket.refresh_from_db()
+        self.assertEqual(basket.total_sum, (first.price + 1000) * 2 + second.price)
+        resp = self.client.get(self.basket_url, headers=headers)
+        self.assertEqual(resp.data[0]['total_sum'], basket.total_sum)
+
+        contact = Contact.objects.create(user_id=self.user.id, **self.contacts_data)
+        self.client.post(self.order_url, data={'order_id': basket.id, 'contact': contact.id}, headers=headers)
+        ProductInfo.objects.filter(id=first.id).update(price=1)
+        price_list_imported.send(sender=self.__class__, shop_id=first.shop_id, summary={})
+        resp = self.client.get(reverse('order_detail', args=[basket.id]), headers=headers)
+        self.assertEqual(resp.data['total_sum'], basket.total_sum)
+        self.assertEqual(resp.data['ordered_items'][0]['price'] + resp.data['ordered_items'][1]['price'],
+                         first.price + 1000 + second.price)
+
+        self.client.post(self.basket_url, data={'items': ujson.dumps(
+            [{'product_info': first.id, 'quantity': 3}, {'product_info': second.id, 'quantity': 1}])}, headers=headers)
+        basket = Order.objects.get(user_id=self.user.id, state='basket')
+        self.client.delete(self.basket_url, data={'items': str(basket.ordered_items.get(product_info=second).id)},
+                           headers=headers)
+        basket.refresh_from_db()
+        self.assertEqual((basket.total_sum, basket.items_count), (3, 1))
+
+        importer = PriceImporter(first.shop)
+        importer.seen = set(ProductInfo.objects.exclude(id=first.id).values_list('external_id', flat=True))
+        importer.finish()
+        self.assertFalse(ProductInfo.objects.filter(id=first.id).exists())
+        basket.refresh_from_db()
+        self.assertEqual((basket.total_sum, basket.items_count), (0, 0))
+
+    def test_partner_order_state(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        url = reverse('partner_order_state')
+        own = ProductInfo.objects.order_by('id')[0]
+        other = ProductInfo.objects.create(product=own.product, shop=Shop.objects.create(name='Другой'),
+                                           external_id=1, quantity=5, price=100, price_rrc=100)
+        buyers = [User.objects.create_user(email=f'buyer{number}@mail.ru', password='15Wvfus89', is_active=True)
+                  for number in range(2)]
+        orders = []
+        for buyer, state, product_info in [(buyers[0], 'new', own), (buyers[0], 'new', own), (buyers[1], 'new', own),
+                                           (buyers[1], 'sent', own), (buyers[1], 'new', other)]:
+            order = Order.objects.create(user=buyer, state=state)
+            OrderItem.objects.create(order=order, product_info=product_info, quantity=2, price=100)
+            orders.append(order)
+        mixed = Order.objects.create(user=buyers[1], state='new')
+        OrderItem.objects.bulk_create([OrderItem(order=mixed, product_info=product_info, quantity=1, price=100)
+                                       for product_info in (own, other)])
+        orders.append(mixed)
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(url, data={'orders': [order.id for order in orders], 'state': 'confirmed'},
+                                    headers=headers, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['Обновлено заказов'], 3)
+        self.assertEqual(resp.data['Пропущенные заказы'], [orders[3].id, orders[4].id, mixed.id])
+        self.assertEqual(list(Order.objects.order_by('id').filter(id__in=[order.id for order in orders]).values_list(
+            'state', flat=True)), ['confirmed', 'confirmed', 'confirmed', 'sent', 'new', 'new'])
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "create_orders_order"')]),
+                         1)
+        self.assertEqual(sorted(OrderStateTransition.objects.values_list('order_id', 'from_state', 'to_state')),
+                         [(order.id, 'new', 'confirmed') for order in orders[:3]])
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [buyers[0].email, buyers[1].email])
+        self.assertIn(f'Заказ id{orders[1].id}: Подтвержден', mail.outbox[0].body + mail.outbox[1].body)
+
+        resp = self.client.post(url, data={'orders': [orders[0].id, orders[3].id], 'state': 'sent'},
+                                headers=headers, format='json')
+        self.assertEqual((resp.data['Обновлено заказов'], resp.data['Пропущенные заказы']),
+                         (0, [orders[0].id, orders[3].id]))
+        resp = self.client.post(url, data={'orders': [orders[0].id], 'state': 'basket'}, headers=headers,
+                                format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        quantity = ProductInfo.objects.get(id=own.id).quantity
+        resp = self.client.post(url, data={'orders': [orders[0].id, orders[1].id, mixed.id], 'state': 'canceled'},
+                                headers=headers, format='json')
+        self.assertEqual(resp.data['Обновлено заказов'], 2)
+        self.assertEqual(ProductInfo.objects.get(id=own.id).quantity, quantity + 4)
+        self.assertEqual(ProductInfo.objects.get(id=other.id).quantity, 5)
+        self.assertEqual(Order.objects.get(id=mixed.id).state, 'new')
+
+    def test_partner_orders_feed(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        own = ProductInfo.objects.order_by('id')[0]
+        other_shop = Shop.objects.create(name='Другой')
+        other = ProductInfo.objects.create(product=own.product, shop=other_shop, external_id=1, quantity=5,
+                                           price=100, price_rrc=100)
+        buyer = User.objects.create_user(email='buyer@mail.ru', password='15Wvfus89', is_active=True)
+        past = timezone.now() - timedelta(minutes=10)
+        orders = []
+        for number, (state, products) in enumerate([('new', [own, other]), ('new', [other]), ('confirmed', [own]),
+                                                    ('basket', [own]), ('new', [own])]):
+            order = Order.objects.create(user=buyer, state=state)
+            OrderItem.objects.bulk_create([OrderItem(order=order, product_info=product_info, quantity=1, price=100)
+                                           for product_info in products])
+            Order.objects.filter(id=order.id).update(updated_at=past + timedelta(seconds=number))
+            orders.append(order)
+        Order.objects.filter(id=orders[4].id).update(updated_at=timezone.now())
+
+        resp = self.client.get(self.orders_url, data={'page_size': 1}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in resp.data['results']], [orders[0].id])
+        self.assertEqual([item['product_info'] for item in resp.data['results'][0]['ordered_items']], [own.id])
+        self.assertEqual(resp.data['results'][0]['ordered_items'][0]['external_id'], own.external_id)
+        resp = self.client.get(resp.data['next'], headers=headers)
+        self.assertEqual([order['id'] for order in resp.data['results']], [orders[2].id])
+        self.assertIsNone(resp.data['next'])
+        cursor = resp.data['cursor']
+
+        resp = self.client.get(self.orders_url, data={'since': cursor}, headers=headers)
+        self.assertEqual((resp.data['results'], resp.data['cursor']), ([], cursor))
+        cancel_order(buyer.id, orders[0].id)
+        Order.objects.filter(id=orders[4].id).update(updated_at=past + timedelta(minutes=1))
+        resp = self.client.get(self.orders_url, data={'since': cursor}, headers=headers)
+        self.assertEqual([order['id'] for order in resp.data['results']], [orders[4].id])
+        Order.objects.filter(id=orders[0].id).update(updated_at=past + timedelta(minutes=2))
+        resp = self.client.get(self.orders_url, data={'since': resp.data['cursor']}, headers=headers)
+        self.assertEqual([(order['id'], order['state']) for order in resp.data['results']],
+                         [(orders[0].id, 'canceled')])
+
+        resp = self.client.get(self.orders_url, data={'page_size': -5}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['results']), 3)
+        Order.objects.filter(id=orders[4].id).update(updated_at=timezone.now())
+        self.assertEqual(len(self.client.get(self.orders_url, headers=headers).data['results']), 2)
+        with self.settings(PARTNER_FEED_DELAY=0):
+            self.assertEqual(len(self.client.get(self.orders_url, headers=headers).data['results']), 3)
+        resp = self.client.get(self.orders_url, data={'since': 'курсор'}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_partner_state(self):
         resp_get = self.client.get(self.state_url, headers={'Authorization': f'Token {self.auth_token}'}, format='json')
@@ -120,4 +305,143 @@ class TestViews(TestSetUP):
         resp_post = self.client.post(self.state_url, headers={'Authorization': f'Token {self.auth_token}'},
                                      data={'state': 'off'}, format='json')
         self.assertEqual(resp_post.status_code, status.HTTP_200_OK)
-        self.assertFalse(Shop.objects.get().state)
\ No newline at end of file
+        self.assertFalse(Shop.objects.get().state)
+
+    def test_post_basket_batch(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+        resp = self.client.post(self.basket_url, data={'items': ujson.dumps(
+            [{'product_info': ids[0], 'quantity': 1}, {'product_info': ids[1], 'quantity': 2}])}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['Создано объектов'], 2)
+
+        items = [{'product_info': product_info_id, 'quantity': 3} for product_info_id in ids]
+        items.append({'product_info': ids[0], 'quantity': 7})
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(self.basket_url, data={'items': ujson.dumps(items)}, headers=headers)
+        self.assertEqual((resp.data['Создано объектов'], resp.data['Обновлено объектов']), (len(ids) - 2, 2))
+        self.assertEqual(dict(OrderItem.objects.values_list('product_info_id', 'quantity')),
+                         {**{product_info_id: 3 for product_info_id in ids}, ids[0]: 7})
+        self.assertEqual(len([query for query in queries if 'create_orders_orderitem' in query['sql']
+                              and 'silk_' not in query['sql'] and not query['sql'].startswith('EXPLAIN')]), 3)
+
+        resp = self.client.post(self.basket_url, data={'items': ujson.dumps(
+            [{'product_info': ids[0], 'quantity': 1}, {'product_info': ids[-1] + 100, 'quantity': 1}])},
+                                headers=headers)
+        self.assertFalse(resp.data['Status'])
+        self.assertEqual(OrderItem.objects.get(product_info_id=ids[0]).quantity, 7)
+        resp = self.client.post(self.basket_url, data={'items': ujson.dumps([{'product_info': ids[0],
+                                                                              'quantity': 0}])}, headers=headers)
+        self.assertFalse(resp.data['Status'])
+
+    def test_put_basket_batch(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+        self.client.post(self.basket_url, data={'items': ujson.dumps(
+            [{'product_info': product_info_id, 'quantity': 1} for product_info_id in ids])}, headers=headers)
+        lines = list(OrderItem.objects.order_by('id').values_list('id', flat=True))
+        other = OrderItem.objects.create(order=Order.objects.create(user=User.objects.create_user(
+            email='other@mail.ru', password='15Wvfus89'), state='basket'), product_info_id=ids[0], quantity=1)
+
+        items = [{'id': line, 'quantity': number + 2} for number, line in enumerate(lines)]
+        items += [{'id': other.id, 'quantity': 5}, {'id': lines[0], 'quantity': 'много'}]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.put(self.basket_url, data={'items': ujson.dumps(items)}, headers=headers)
+        self.assertEqual(resp.data['Обновлено позиций'], len(lines))
+        self.assertEqual([result['status'] for result in resp.data['items']],
+                         ['updated'] * len(lines) + ['not_found', 'invalid'])
+        self.assertEqual(list(OrderItem.objects.filter(id__in=lines).order_by('id').values_list('quantity', flat=True)),
+                         [number + 2 for number in range(len(lines))])
+        self.assertEqual(OrderItem.objects.get(id=other.id).quantity, 1)
+        self.assertEqual(len([query for query in queries
+                              if query['sql'].startswith('UPDATE "create_orders_orderitem"')]), 1)
+
+    def test_stock_reservation(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        contact = Contact.objects.create(user_id=self.user.id, **self.contacts_data)
+        first, second = ProductInfo.objects.order_by('id')[:2]
+        order = Order.objects.create(user_id=self.user.id, state='basket')
+        OrderItem.objects.create(order=order, product_info=first, quantity=first.quantity)
+        OrderItem.objects.create(order=order, product_info=second, quantity=second.quantity + 1)
+
+        resp = self.client.post(self.order_url, data={'order_id': order.id, 'contact': contact.id}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.data['shortfall'], [{'product_info': second.id, 'requested': second.quantity + 1,
+                                                   'available': second.quantity}])
+        self.assertEqual(ProductInfo.objects.get(id=first.id).quantity, first.quantity)
+        self.assertEqual(Order.objects.get(id=order.id).state, 'basket')
+
+        OrderItem.objects.filter(order=order, product_info=second).update(quantity=2)
+        versions = get_versions(['catalog', f'shop:{first.shop_id}'])
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(self.order_url, data={'order_id': order.id, 'contact': contact.id},
+                                    headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_versions(['catalog', f'shop:{first.shop_id}']), [versions[0], versions[1] + 1])
+        self.assertEqual(ProductInfo.objects.get(id=first.id).quantity, 0)
+        self.assertEqual(ProductInfo.objects.get(id=second.id).quantity, second.quantity - 2)
+        self.assertEqual(CatalogItem.objects.get(pk=second.id).data['quantity'], second.quantity - 2)
+
+        resp = self.client.delete(self.order_url, data={'order_id': order.id}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(Order.objects.get(id=order.id).state, 'canceled')
+        self.assertEqual(ProductInfo.objects.get(id=first.id).quantity, first.quantity)
+        self.assertEqual(ProductInfo.objects.get(id=second.id).quantity, second.quantity)
+        resp = self.client.delete(self.order_url, data={'order_id': order.id}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(ProductInfo.objects.get(id=first.id).quantity, first.quantity)
+
+
+class TestStockConcurrency(TransactionTestCase):
+    """
+    Параллельные оформления заказов в отдельных потоках и соединениях с БД.
+    """
+    buyers = 8
+
+    def setUp(self):
+        shop = Shop.objects.create(name='Склад')
+        category = Category.objects.create(id=1000, name='Тест')
+        self.stock = [ProductInfo.objects.create(
+            product=Product.objects.create(name=f'Товар {number}', category=category), shop=shop,
+            external_id=number, quantity=5, price=100, price_rrc=100) for number in range(2)]
+        self.orders = []
+        for number in range(self.buyers):
+            user = User.objects.create_user(email=f'buyer{number}@mail.ru', password='15Wvfus89', is_active=True)
+            order = Order.objects.create(user=user, state='basket')
+            items = [OrderItem(order=order, product_info=product_info, quantity=2) for product_info in self.stock]
+            OrderItem.objects.bulk_create(items[::-1] if number % 2 else items)
+            contact = Contact.objects.create(user=user, city='Москва', street='Тверская', phone='+7 900 000 00 00')
+            self.orders.append((user.id, order.id, contact.id))
+
+    def run_concurrently(self, function, arguments):
+        barrier = threading.Barrier(len(arguments))
+        results = [None] * len(arguments)
+
+        def worker(number):
+            try:
+                barrier.wait()
+                results[number] = function(*arguments[number])
+            except Exception as error:
+                results[number] = error
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(len(arguments))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_checkout(self):
+        results = self.run_concurrently(place_order, self.orders)
+        placed = [result for result in results if isinstance(result, Order)]
+        self.assertEqual(len(placed), 2)
+        self.assertTrue(all(isinstance(result, OutOfStock) for result in results if result not in placed))
+        self.assertEqual(list(ProductInfo.objects.filter(id__in=[product_info.id for product_info in self.stock])
+                              .values_list('quantity', flat=True)), [1, 1])
+
+        results = self.run_concurrently(cancel_order, [(order.user_id, order.id) for order in placed] * 2)
+        self.assertEqual(sum(results), 2)
+        self.assertEqual(list(ProductInfo.objects.filter(id__in=[product_info.id for product_info in self.stock])
+                              .values_list('quantity', flat=True)), [5, 5])
@@ -0,0 +1,22 @@
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from ordering_goods.models import ProductInfo
+from .models import Order, OrderItem
+
+
+def update_totals(order_ids):
+    """
+    Пересчитывает сумму и количество позиций заказов одним UPDATE по ценам, сохранённым в позициях.
+    """
+    items = OrderItem.objects.filter(order_id=OuterRef('id')).order_by().values('order_id')
+    Order.objects.filter(id__in=order_ids).update(
+        total_sum=Coalesce(Subquery(items.annotate(total=Sum(F('quantity') * F('price'))).values('total')),
+                           Value(0)),
+        items_count=Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), Value(0)))
+
+
+def snapshot_prices(items):
+    """
+    Записывает в позиции текущие цены ProductInfo.
+    """
+    items.update(price=Subquery(ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price')))
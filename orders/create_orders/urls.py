@@ -8,7 +8,9 @@ router.register(r'user/contact', viewset=ContactViewSet, basename='user_contact'
 
 urlpatterns = [
     path('order', OrderView.as_view(), name='order'),
+    path('order/<int:pk>', OrderDetailView.as_view(), name='order_detail'),
     path('basket', BasketView.as_view(), name='basket'),
     path('partner/orders', PartnerOrders.as_view(), name='partner_orders'),
+    path('partner/orders/state', PartnerOrderStateView.as_view(), name='partner_order_state'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,18 +1,25 @@
+from datetime import datetime, time, timedelta
 from distutils.util import strtobool
 import ujson
-from django.db.models import Q, F, Sum
-from django.db import IntegrityError
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.db import IntegrityError, transaction
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
+from rest_framework.generics import RetrieveAPIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample
-from ordering_goods.models import Shop
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter
+from ordering_goods.models import Shop, CatalogItem, ProductInfo
+from ordering_goods.cache import bump_catalog_version
 from ordering_goods.serializers import ShopSerializer
 from .models import *
 from .signals import *
 from .serializers import *
+from .inventory import OutOfStock, place_order
+from .lifecycle import cancel_order, transition_orders
+from .totals import update_totals
+from .pagination import OrderHistoryPagination, PartnerFeedPagination
 
 
 @extend_schema(tags=['Пользователи'])
@@ -76,9 +83,8 @@ class BasketView(APIView):
     def get(self, request, *args, **kwargs):
         basket = Order.objects.filter(
             user_id=request.user.id, state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+            'ordered_items__product_info__product',
+            'ordered_items__product_info__product_parameters')
         serializer = OrderSerializer(basket, many=True)
         return Response(serializer.data)
 
@@ -90,21 +96,29 @@ class BasketView(APIView):
             except ValueError:
                 return Response({'Status': False, 'Errors': 'Неверный формат запроса'})
             else:
-                basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-                objects_created = 0
-                for order_item in items_dict:
-                    order_item.update({'order': basket.id})
-                    serializer = OrderItemSerializer(data=order_item)
-                    if serializer.is_valid():
-                        try:
-                            serializer.save()
-                        except IntegrityError as error:
-                            return Response({'Status': False, 'Errors': str(error)})
-                        else:
-                            objects_created += 1
-                    else:
-                        return Response({'Status': False, 'Errors': serializer.errors})
-                return Response({'Status': True, 'Создано объектов': objects_created}, status=status.HTTP_201_CREATED)
+                if not isinstance(items_dict, list):
+                    return Response({'Status': False, 'Errors': 'Неверный формат запроса'})
+                serializer = BasketItemSerializer(data=items_dict, many=True)
+                if not serializer.is_valid():
+                    return Response({'Status': False, 'Errors': serializer.errors})
+                quantities = {item['product_info']: item['quantity'] for item in serializer.validated_data}
+                prices = dict(ProductInfo.objects.filter(id__in=list(quantities)).values_list('id', 'price'))
+                missing = quantities.keys() - prices.keys()
+                if missing:
+                    return Response({'Status': False, 'Errors': f'Товары не найдены: {sorted(missing)}'})
+                with transaction.atomic():
+                    basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
+                    objects_updated = OrderItem.objects.filter(order_id=basket.id,
+                                                               product_info_id__in=list(quantities)).count()
+                    OrderItem.objects.bulk_create(
+                        [OrderItem(order_id=basket.id, product_info_id=product_info_id, quantity=quantity,
+                                   price=prices[product_info_id])
+                         for product_info_id, quantity in quantities.items()],
+                        update_conflicts=True, unique_fields=['order', 'product_info'],
+                        update_fields=['quantity', 'price'])
+                    update_totals([basket.id])
+                return Response({'Status': True, 'Создано объектов': len(quantities) - objects_updated,
+                                 'Обновлено объектов': objects_updated}, status=status.HTTP_201_CREATED)
         return Response({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
     def put(self, request, *args, **kwargs):
@@ -115,13 +129,29 @@ class BasketView(APIView):
             except ValueError:
                 return Response({'status': False, 'Error': 'Не верный формат запроса'})
             else:
-                basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-                objects_update = 0
+                if not isinstance(items_dict, list):
+                    return Response({'status': False, 'Error': 'Не верный формат запроса'})
+                results, quantities = [], {}
                 for order_item in items_dict:
-                    if type(order_item['id']) == int and type(order_item['quantity']) == int:
-                        objects_update += OrderItem.objects.filter(order_id=basket.id, id=order_item['id']).update(
-                            quantity=order_item['quantity'])
-                return Response({'status': True, 'Обновлено позиций': objects_update})
+                    serializer = BasketItemUpdateSerializer(data=order_item)
+                    if serializer.is_valid():
+                        quantities[serializer.validated_data['id']] = serializer.validated_data['quantity']
+                        results.append({'id': serializer.validated_data['id'], 'status': 'updated'})
+                    else:
+                        results.append({'id': order_item.get('id') if isinstance(order_item, dict) else None,
+                                        'status': 'invalid', 'errors': serializer.errors})
+                basket_items = list(OrderItem.objects.filter(order__user_id=request.user.id, order__state='basket',
+                                                             id__in=list(quantities)))
+                for basket_item in basket_items:
+                    basket_item.quantity = quantities[basket_item.id]
+                with transaction.atomic():
+                    OrderItem.objects.bulk_update(basket_items, ['quantity'])
+                    update_totals({basket_item.order_id for basket_item in basket_items})
+                found = {basket_item.id for basket_item in basket_items}
+                for result in results:
+                    if result['status'] == 'updated' and result['id'] not in found:
+                        result['status'] = 'not_found'
+                return Response({'status': True, 'Обновлено позиций': len(basket_items), 'items': results})
         return Response({'status': False, 'Error': 'Не указаны все необходимые параметры'})
 
     def delete(self, request, *args, **kwargs):
@@ -136,7 +166,9 @@ class BasketView(APIView):
                     query = query | Q(order_id=basket.id, id=item_id)
                     deleted_positions = True
             if deleted_positions:
-                deleted_positions_count = OrderItem.objects.filter(query).delete()[0]
+                with transaction.atomic():
+                    deleted_positions_count = OrderItem.objects.filter(query).delete()[0]
+                    update_totals([basket.id])
                 left_position_count = OrderItem.objects.filter(order_id=basket.id).count()
                 if left_position_count == 0:
                     Order.objects.filter(state='basket', user_id=request.user.id).delete()
@@ -148,6 +180,10 @@ class BasketView(APIView):
         return Response({'status': False, 'Error': 'Не указаны все необходимые параметры'})
 
 
+def day_start(day):
+    return datetime.combine(day, time.min)
+
+
 @extend_schema(tags=['Заказы'])
 class OrderView(APIView):
     permission_classes = [IsAuthenticated]
@@ -155,40 +191,102 @@ class OrderView(APIView):
     def post(self, request, *args, **kwargs):
         if {'order_id', 'contact'}.issubset(request.data):
             try:
-                updated = Order.objects.filter(user_id=request.user.id, id=request.data['order_id']).update(
-                    contact_id=request.data['contact'], state='new')
-            except IntegrityError as error:
+                order = place_order(request.user.id, request.data['order_id'], request.data['contact'])
+            except OutOfStock as error:
+                return Response({'status': False, 'Error': str(error), 'shortfall': error.shortfall},
+                                status=status.HTTP_409_CONFLICT)
+            except (IntegrityError, ValueError) as error:
                 return Response({'status': False, 'Error': 'Не верно указаны аругменты'})
             else:
-                if updated:
+                if order:
                     order_is_created.send(sender=self.__class__, user_id=request.user.id,
                                           order_id=request.data['order_id'])
                     return Response({'status': True})
         return Response({'status': False, 'Error': 'Не указаны все необходимые параметры'})
 
+    def delete(self, request, *args, **kwargs):
+        order_id = request.data.get('order_id')
+        if order_id:
+            try:
+                canceled = cancel_order(request.user.id, order_id)
+            except ValueError:
+                return Response({'status': False, 'Error': 'Не верно указаны аругменты'})
+            if canceled:
+                return Response({'status': True})
+            return Response({'status': False, 'Error': 'Заказ не найден или не может быть отменен'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response({'status': False, 'Error': 'Не указаны все необходимые параметры'})
+
+    @extend_schema(summary='История заказов пользователя без состава заказов',
+                   parameters=[OrderHistoryFilterSerializer], responses=OrderSummarySerializer(many=True))
     def get(self, request, *args, **kwargs):
-        order = Order.objects.filter(user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        filters = OrderHistoryFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response({'status': False, 'Errors': filters.errors}, status=status.HTTP_400_BAD_REQUEST)
+        orders = Order.objects.filter(user_id=request.user.id).exclude(state='basket').only(
+            'id', 'state', 'creating_date', 'total_sum', 'items_count')
+        if 'state' in filters.validated_data:
+            orders = orders.filter(state=filters.validated_data['state'])
+        if 'date_from' in filters.validated_data:
+            orders = orders.filter(creating_date__gte=day_start(filters.validated_data['date_from']))
+        if 'date_to' in filters.validated_data:
+            orders = orders.filter(creating_date__lt=day_start(filters.validated_data['date_to'] + timedelta(days=1)))
+        paginator = OrderHistoryPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        return paginator.get_paginated_response(OrderSummarySerializer(page, many=True).data)
+
+
+@extend_schema(tags=['Заказы'])
+@extend_schema_view(get=extend_schema(summary='Заказ пользователя с составом'))
+class OrderDetailView(RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = OrderSerializer
+
+    def get_queryset(self):
+        return Order.objects.filter(user_id=self.request.user.id).exclude(state='basket').prefetch_related(
+            'ordered_items__product_info__product',
+            'ordered_items__product_info__product_parameters').select_related('contact')
 
 
 @extend_schema(tags=['Заказы'])
 class PartnerOrders(APIView):
     permission_classes = [IsAuthenticated]
 
+    @extend_schema(summary='Лента заказов магазина с его позициями',
+                   parameters=[OpenApiParameter('since', str, description='cursor из предыдущего ответа'),
+                               OpenApiParameter('page_size', int)],
+                   responses=PartnerOrderSerializer(many=True))
     def get(self, request, *args, **kwargs):
         if request.user.type != 'shop':
             return Response({'Status': False, 'Error': 'Только для магазинов'})
-        order = Order.objects.filter(
-            ordered_items__product_info__shop__user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        items = OrderItem.objects.filter(product_info__shop__user_id=request.user.id)
+        orders = Order.objects.filter(Exists(items.filter(order_id=OuterRef('id')))).exclude(
+            state='basket').select_related('contact').prefetch_related(
+            Prefetch('ordered_items', queryset=items.select_related('product_info__product').order_by('id')))
+        paginator = PartnerFeedPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        return paginator.get_paginated_response(PartnerOrderSerializer(page, many=True).data)
+
+
+@extend_schema(tags=['Заказы'])
+class PartnerOrderStateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(summary='Смена статуса заказов магазина',
+                   request=OrderTransitionSerializer,
+                   examples=[OpenApiExample('Пример отправки заказов',
+                                            value={'orders': [1, 2, 3], 'state': 'sent'})])
+    def post(self, request, *args, **kwargs):
+        if request.user.type != 'shop':
+            return Response({'Status': False, 'Error': 'Только для магазинов'})
+        serializer = OrderTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'Status': False, 'Errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        order_ids = set(serializer.validated_data['orders'])
+        changed = transition_orders(order_ids, serializer.validated_data['state'], user_id=request.user.id,
+                                    shop_user_id=request.user.id)
+        return Response({'Status': True, 'Обновлено заказов': len(changed),
+                         'Пропущенные заказы': sorted(order_ids - set(changed))})
 
 
 @extend_schema(tags=['Поставщики'])
@@ -216,7 +314,11 @@ class PartnerStateSet(ModelViewSet):
         state = request.data.get('state')
         if state:
             try:
-                Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                with transaction.atomic():
+                    Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                    CatalogItem.objects.filter(shop__user_id=request.user.id).update(shop_state=strtobool(state))
+                    for shop_id in Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True):
+                        bump_catalog_version(shop_id)
                 return Response({'State changed to': state})
             except ValueError as error:
                 return Response({'Status': False, 'Errors': str(error)})
@@ -0,0 +1,140 @@
+import logging
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from time import monotonic
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import OutgoingEmail
+
+
+logger = logging.getLogger(__name__)
+
+RATE_PREFIX = 'mailing:rate:'
+
+RATE_WINDOW = 60
+
+
+class ConnectionPool:
+    """
+    Одно открытое соединение с почтовым сервером на процесс, общее для всех пакетов.
+    Соединение, простоявшее без дела дольше MAILING_CONNECTION_IDLE секунд, открывается заново.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.used = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        if self.connection is not None and monotonic() - self.used > settings.MAILING_CONNECTION_IDLE:
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        self.used = monotonic()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+pool = ConnectionPool()
+
+
+def domain_rate(domain):
+    return settings.MAILING_DOMAIN_RATES.get(domain, settings.MAILING_DOMAIN_RATE)
+
+
+def take_rate(domain, count):
+    """
+    Сколько из count писем на domain можно отправить в текущей минуте по общему счётчику в кэше.
+    """
+    key = f'{RATE_PREFIX}{domain}:{int(time.time() // RATE_WINDOW)}'
+    cache.add(key, 0, RATE_WINDOW * 2)
+    used = cache.incr(key, count)
+    excess = min(max(used - domain_rate(domain), 0), count)
+    if excess:
+        cache.decr(key, excess)
+    return count - excess
+
+
+def claim_batch(batch_size):
+    """
+    Забирает пакет писем, которым пора отправляться. Письма сверх лимита своего домена
+    переносятся на следующую минуту, остальные помечаются новой попыткой и откладываются
+    на MAILING_LEASE секунд, чтобы при падении воркера их подобрала следующая задача.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+            state='queued', next_attempt_at__lte=now).order_by('next_attempt_at', 'id')[:batch_size])
+        by_domain = {}
+        for email in emails:
+            by_domain.setdefault(email.domain, []).append(email)
+        claimed, deferred = [], []
+        for domain, domain_emails in by_domain.items():
+            allowed = take_rate(domain, len(domain_emails))
+            claimed += domain_emails[:allowed]
+            deferred += domain_emails[allowed:]
+        if deferred:
+            OutgoingEmail.objects.filter(id__in=[email.id for email in deferred]).update(
+                next_attempt_at=now + timedelta(seconds=RATE_WINDOW - time.time() % RATE_WINDOW))
+        OutgoingEmail.objects.filter(id__in=[email.id for email in claimed]).update(
+            attempts=F('attempts') + 1, next_attempt_at=now + timedelta(seconds=settings.MAILING_LEASE))
+    for email in claimed:
+        email.attempts += 1
+    return claimed, len(emails)
+
+
+def is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def fail(email, error, now):
+    email.error = str(error)
+    if is_permanent(error) or email.attempts >= settings.MAILING_MAX_ATTEMPTS:
+        email.state = 'dead'
+        logger.warning('Письмо %s для %s не доставлено: %s', email.id, email.to, error)
+    else:
+        email.next_attempt_at = now + timedelta(seconds=settings.MAILING_RETRY_DELAY * 2 ** (email.attempts - 1))
+
+
+def send_batch(batch_size=None):
+    """
+    Отправляет пакет писем через общее соединение пула. Временные ошибки откладывают письмо
+    с удвоением задержки MAILING_RETRY_DELAY, после MAILING_MAX_ATTEMPTS попыток и при
+    постоянной ошибке сервера письмо остаётся в очереди со статусом dead.
+    Возвращает число писем, взятых из очереди.
+    """
+    claimed, taken = claim_batch(batch_size or settings.MAILING_BATCH_SIZE)
+    if not claimed:
+        return taken
+    now = timezone.now()
+    with pool.lock:
+        for email in claimed:
+            message = EmailMultiAlternatives(email.subject, email.body, email.from_email, [email.to])
+            try:
+                pool.get().send_messages([message])
+            except OSError as error:
+                if not isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    pool.close()
+                fail(email, error, now)
+            else:
+                email.state = 'sent'
+                email.sent_at = now
+                email.error = ''
+    OutgoingEmail.objects.bulk_update(claimed, ['state', 'sent_at', 'next_attempt_at', 'error'])
+    return taken
@@ -0,0 +1,33 @@
+from django.db import models
+from django.utils import timezone
+
+
+EMAIL_STATES = (
+    ('queued', 'В очереди'),
+    ('sent', 'Отправлено'),
+    ('dead', 'Не доставлено'),
+)
+
+
+class OutgoingEmail(models.Model):
+    subject = models.CharField(verbose_name='Тема', max_length=255)
+    body = models.TextField(verbose_name='Текст')
+    from_email = models.CharField(verbose_name='Отправитель', max_length=254)
+    to = models.EmailField(verbose_name='Получатель')
+    domain = models.CharField(verbose_name='Домен получателя', max_length=254)
+    state = models.CharField(verbose_name='Статус', choices=EMAIL_STATES, max_length=15, default='queued')
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попыток отправки', default=0)
+    next_attempt_at = models.DateTimeField(verbose_name='Следующая попытка', default=timezone.now)
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+    created_at = models.DateTimeField(verbose_name='Создано', auto_now_add=True)
+    sent_at = models.DateTimeField(verbose_name='Отправлено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Очередь исходящих писем'
+        ordering = ('-created_at',)
+        indexes = [models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(state='queued'),
+                                name='outgoing_email_queue_idx'),]
+
+    def __str__(self):
+        return f'{self.to} {self.subject}'
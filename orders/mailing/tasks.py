@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from orders.celery import app
+from .dispatch import RATE_WINDOW, send_batch
+from .models import OutgoingEmail
+
+
+SCHEDULED_KEY = 'mailing:scheduled'
+
+
+def queue_emails(messages, from_email=None):
+    """
+    Ставит в очередь письма (тема, текст, получатели) одним INSERT, по строке OutgoingEmail
+    на получателя, и после коммита транзакции планирует отправку. Письма, поставленные
+    в течение MAILING_DISPATCH_DELAY секунд, уходят одной задачей dispatch_emails.
+    """
+    OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(subject=subject, body=body, from_email=from_email or settings.DEFAULT_FROM_EMAIL, to=to,
+                      domain=to.rsplit('@', 1)[-1].lower())
+        for subject, body, recipients in messages for to in recipients])
+
+    def schedule():
+        if cache.add(SCHEDULED_KEY, 1, settings.MAILING_DISPATCH_DELAY + RATE_WINDOW):
+            dispatch_emails.apply_async(countdown=settings.MAILING_DISPATCH_DELAY)
+    transaction.on_commit(schedule)
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    queue_emails([(subject, body, recipients)], from_email)
+
+
+@app.task
+def dispatch_emails():
+    """
+    Отправляет очередь писем пакетами, пока в ней есть письма, которым пора отправляться.
+    Запускается после постановки писем в очередь и Celery beat для повторных попыток.
+    """
+    cache.delete(SCHEDULED_KEY)
+    total = 0
+    while True:
+        taken = send_batch()
+        if not taken:
+            return total
+        total += taken
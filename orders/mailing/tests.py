@@ -0,0 +1,88 @@
+import socket
+from datetime import timedelta
+from aiosmtpd.controller import Controller
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from mailing.dispatch import pool, send_batch
+from mailing.models import OutgoingEmail
+from mailing.tasks import dispatch_emails, queue_email, queue_emails
+
+
+class RecordingHandler:
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('bad@'):
+            return '550 No such user'
+        if address.startswith('later@'):
+            return '451 Try again later'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope.rcpt_tos[0])
+        self.sessions.add(id(session))
+        return '250 OK'
+
+
+class TestDispatch(TestCase):
+
+    def setUp(self) -> None:
+        pool.close()
+        cache.clear()
+        self.handler = RecordingHandler()
+        with socket.socket() as free:
+            free.bind(('127.0.0.1', 0))
+            port = free.getsockname()[1]
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=port)
+        self.controller.start()
+        self.smtp = override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                      EMAIL_HOST='127.0.0.1', EMAIL_PORT=port, EMAIL_USE_SSL=False,
+                                      EMAIL_HOST_PASSWORD='')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        pool.close()
+        self.controller.stop()
+        return super().tearDown()
+
+    def test_batch_over_one_connection(self):
+        recipients = [f'user{number}@mail.ru' for number in range(5)] + ['user@yandex.ru']
+        with self.smtp, self.captureOnCommitCallbacks(execute=True):
+            queue_emails([('Тема', f'Письмо {to}', [to]) for to in recipients])
+        self.assertEqual(sorted(self.handler.messages), sorted(recipients))
+        self.assertEqual(len(self.handler.sessions), 1)
+        self.assertEqual(OutgoingEmail.objects.filter(state='sent').count(), len(recipients))
+
+    def test_retry_and_dead_letter(self):
+        queue_email('Тема', 'Текст', ['ok@mail.ru', 'bad@mail.ru', 'later@mail.ru'])
+        with self.smtp:
+            self.assertEqual(dispatch_emails(), 3)
+        states = dict(OutgoingEmail.objects.values_list('to', 'state'))
+        self.assertEqual(states, {'ok@mail.ru': 'sent', 'bad@mail.ru': 'dead', 'later@mail.ru': 'queued'})
+        later = OutgoingEmail.objects.get(to='later@mail.ru')
+        self.assertEqual(later.attempts, 1)
+        self.assertGreater(later.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        with self.smtp:
+            self.assertEqual(send_batch(), 0)
+        with self.settings(MAILING_MAX_ATTEMPTS=2), self.smtp:
+            OutgoingEmail.objects.filter(id=later.id).update(next_attempt_at=timezone.now())
+            send_batch()
+        later.refresh_from_db()
+        self.assertEqual((later.state, later.attempts), ('dead', 2))
+        self.assertIn('451', later.error)
+
+    @override_settings(MAILING_DOMAIN_RATES={'mail.ru': 2})
+    def test_domain_rate_limit(self):
+        queue_emails([('Тема', 'Текст', [f'user{number}@mail.ru' for number in range(3)] + ['user@yandex.ru'])])
+        self.assertEqual(dispatch_emails(), 4)
+        self.assertEqual(len(mail.outbox), 3)
+        deferred = OutgoingEmail.objects.get(state='queued')
+        self.assertEqual((deferred.domain, deferred.attempts), ('mail.ru', 0))
+        self.assertGreater(deferred.next_attempt_at, timezone.now())
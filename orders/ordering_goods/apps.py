@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class OrderingGoodsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ordering_goods'
+
+    def ready(self):
+        from celery.signals import worker_process_init
+        from .cache import warm_dictionaries
+        worker_process_init.connect(warm_dictionaries)
@@ -0,0 +1,212 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from time import monotonic
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from rest_framework import status
+from rest_framework.response import Response
+from .models import Category, Parameter
+
+
+VERSION_PREFIX = 'catalog:version:'
+
+RESPONSE_PREFIX = 'catalog:response:'
+
+NAMES_CHECK_INTERVAL = 5
+
+
+class LocalCache:
+    """
+    LRU в памяти процесса перед общим кэшем в Redis.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+local_cache = LocalCache(settings.CATALOG_LOCAL_CACHE_SIZE)
+
+
+def get_versions(names):
+    keys = [VERSION_PREFIX + name for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*names):
+    for name in names:
+        try:
+            cache.incr(VERSION_PREFIX + name)
+        except ValueError:
+            cache.set(VERSION_PREFIX + name, time.time_ns(), None)
+
+
+def bump_catalog_version(shop_id=None, categories=False, catalog=True):
+    """
+    После коммита транзакции увеличивает общую версию каталога и версии магазина и категорий,
+    от которых зависят ключи закэшированных ответов. С catalog=False общая версия не меняется.
+    """
+    names = ['catalog'] if catalog else []
+    if shop_id:
+        names.append(f'shop:{shop_id}')
+    if categories:
+        names.append('categories')
+    transaction.on_commit(lambda: bump_versions(*names))
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует ответ GET по адресу запроса и версиям из catalog_versions
+    и отвечает 304 на If-None-Match с актуальным ETag.
+    """
+
+    def catalog_versions(self, request):
+        return ['catalog']
+
+    def get(self, request, *args, **kwargs):
+        versions = get_versions(self.catalog_versions(request))
+        key = hashlib.sha1(f'{request.get_host()}{request.get_full_path()}{versions}'.encode()).hexdigest()
+        headers = {'ETag': f'"{key}"', 'Cache-Control': 'private, no-cache'}
+        if headers['ETag'] in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = local_cache.get(key)
+        if data is None:
+            data = cache.get(RESPONSE_PREFIX + key)
+            if data is None:
+                response = super().get(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                data = response.data
+                cache.set(RESPONSE_PREFIX + key, data, settings.CATALOG_CACHE_TIMEOUT)
+            local_cache.set(key, data)
+        return Response(data, headers=headers)
+
+
+class NameDictionary:
+    """
+    Словарь id и названий справочника в памяти процесса. Версия в общем кэше сверяется
+    не чаще раза в NAMES_CHECK_INTERVAL секунд, при её смене словарь загружается заново.
+    Записи попадают в словарь только после коммита транзакции, в которой они прочитаны,
+    поэтому откаченные id в него не попадают.
+    """
+
+    def __init__(self, model, version_name):
+        self.model = model
+        self.version_name = version_name
+        self.names = {}
+        self.ids = {}
+        self.version = None
+        self.checked = None
+        self.lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def check(self):
+        if self.checked is not None and monotonic() - self.checked < NAMES_CHECK_INTERVAL:
+            return
+        self.checked = monotonic()
+        version = get_versions([self.version_name])[0]
+        if version != self.version:
+            names = dict(self.model.objects.values_list('id', 'name'))
+            transaction.on_commit(lambda: self.replace(names, version))
+
+    def replace(self, names, version):
+        with self.lock:
+            self.names = names
+            self.ids = {name: object_id for object_id, name in names.items()}
+            self.version = version
+
+    def remember(self, names):
+        def add():
+            with self.lock:
+                self.names.update(names)
+                self.ids.update({name: object_id for object_id, name in names.items()})
+        transaction.on_commit(add)
+
+    def forget(self, ids):
+        with self.lock:
+            for object_id in ids:
+                self.ids.pop(self.names.pop(object_id, None), None)
+
+    def clear(self):
+        with self.lock:
+            self.names, self.ids, self.version, self.checked = {}, {}, None, None
+
+    def get_names(self, ids):
+        self.check()
+        names = {object_id: self.names[object_id] for object_id in ids if object_id in self.names}
+        missing = set(ids) - names.keys()
+        if missing:
+            found = dict(self.model.objects.filter(id__in=missing).values_list('id', 'name'))
+            self.remember(found)
+            names.update(found)
+        return names
+
+    def get_name(self, object_id):
+        return self.get_names([object_id]).get(object_id)
+
+    def get_ids(self, names):
+        """
+        id по названиям, недостающие записи создаются.
+        """
+        self.check()
+        ids = {name: self.ids[name] for name in names if name in self.ids}
+        missing = set(names) - ids.keys()
+        if missing:
+            found = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+            if len(found) < len(missing):
+                self.model.objects.bulk_create([self.model(name=name) for name in missing - found.keys()],
+                                               ignore_conflicts=True)
+                found = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+                transaction.on_commit(lambda: bump_versions(self.version_name))
+            self.remember({object_id: name for name, object_id in found.items()})
+            ids.update(found)
+        return ids
+
+
+parameter_names = NameDictionary(Parameter, 'parameters')
+
+category_names = NameDictionary(Category, 'categories')
+
+
+def warm_dictionaries(**kwargs):
+    """
+    Загружает словари при старте процесса: воркера Celery по worker_process_init
+    и веб-сервера из orders.wsgi и orders.asgi. Если таблиц ещё нет (до migrate),
+    словари заполнятся при первом обращении.
+    """
+    try:
+        for dictionary in (parameter_names, category_names):
+            dictionary.checked = None
+            dictionary.check()
+    except DatabaseError:
+        pass
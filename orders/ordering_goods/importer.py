@@ -0,0 +1,392 @@
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+from time import monotonic
+from django.contrib.postgres.search import SearchVector
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.db.models.fields.json import KT
+from .models import *
+from .cache import bump_catalog_version, category_names, parameter_names
+from .signals import price_list_imported
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+PRODUCT_INFO_FIELDS = ['product_id', 'model', 'price', 'price_rrc', 'quantity']
+
+CATALOG_FIELDS = ['shop_id', 'category_id', 'shop_state', 'price', 'data']
+
+STAGED_FIELDS = ['external_id', 'product_info_id', 'product_id', 'model', 'price', 'price_rrc', 'quantity', 'state',
+                 'parameters', 'parameters_changed', 'catalog']
+
+NUMBER = re.compile(r'^\s*-?\d+(?:[.,]\d+)?\s*$')
+
+SEARCH_VECTOR = SearchVector(KT('data__product__name'), weight='A', config=SEARCH_CONFIG) + SearchVector(
+    KT('data__model'), weight='B', config=SEARCH_CONFIG)
+
+
+def chunked(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def load_categories(categories, batch_size=BATCH_SIZE):
+    categories = {int(category['id']): category['name'] for category in categories}
+    existing = Category.objects.in_bulk(list(categories))
+    created, changed = [], []
+    for category_id, name in categories.items():
+        category = existing.get(category_id)
+        if category is None:
+            created.append(Category(id=category_id, name=name))
+        elif category.name != name:
+            category.name = name
+            changed.append(category)
+    Category.objects.bulk_create(created, batch_size=batch_size, ignore_conflicts=True)
+    Category.objects.bulk_update(changed, ['name'], batch_size=batch_size)
+    if created or changed:
+        bump_catalog_version(categories=True)
+    if changed:
+        category_names.forget([category.id for category in changed])
+        refresh_catalog(CatalogItem.objects.filter(category_id__in=[category.id for category in changed]).values_list(
+            'product_info_id', flat=True), batch_size)
+    return list(categories)
+
+
+def parse_number(value):
+    """
+    Число из значения параметра вида 512, 6.5 или 6,5, для остальных значений None.
+    """
+    if NUMBER.match(value):
+        number = float(value.replace(',', '.'))
+        if math.isfinite(number):
+            return number
+    return None
+
+
+def find_products(keys):
+    products = {}
+    for name, category_id, product_id in Product.objects.filter(
+            name__in={name for name, _ in keys}).values_list('name', 'category_id', 'id'):
+        if (name, category_id) in keys:
+            products[(name, category_id)] = product_id
+    return products
+
+
+def resolve_products(goods):
+    keys = {(item['name'], int(item['category'])) for item in goods}
+    products = find_products(keys)
+    missing = keys - products.keys()
+    if missing:
+        Product.objects.bulk_create([Product(name=name, category_id=category_id) for name, category_id in missing],
+                                    ignore_conflicts=True)
+        for name, category_id, product_id in Product.objects.filter(
+                name__in={name for name, _ in missing}).values_list('name', 'category_id', 'id'):
+            if (name, category_id) in missing:
+                products[(name, category_id)] = product_id
+    return products
+
+
+def basket_ids(product_infos):
+    return product_infos.filter(ordered_items__order__state='basket').values_list(
+        'ordered_items__order_id', flat=True).distinct()
+
+
+def product_info_values(item, product_id):
+    return {'product_id': product_id,
+            'model': item['model'],
+            'price': item['price'],
+            'price_rrc': item['price_rrc'],
+            'quantity': item['quantity']}
+
+
+def catalog_item(product_info, categories, parameters):
+    """
+    Строка каталога с уже готовым представлением позиции в формате ProductInfoSerializer.
+    Названия категорий и параметров берутся из словарей categories и parameters.
+    """
+    return CatalogItem(product_info_id=product_info.id,
+                       shop_id=product_info.shop_id,
+                       category_id=product_info.product.category_id,
+                       shop_state=product_info.shop.state,
+                       price=product_info.price,
+                       data={'id': product_info.id,
+                             'model': product_info.model,
+                             'product': {'name': product_info.product.name,
+                                         'category': categories[product_info.product.category_id]},
+                             'shop': product_info.shop_id,
+                             'quantity': product_info.quantity,
+                             'price': product_info.price,
+                             'price_rrc': product_info.price_rrc,
+                             'product_parameters': [{'parameter': parameters[parameter.parameter_id],
+                                                     'value': parameter.value}
+                                                    for parameter in product_info.product_parameters.all()]})
+
+
+def refresh_catalog(product_info_ids, batch_size=BATCH_SIZE):
+    for batch in chunked(product_info_ids, batch_size):
+        product_infos = list(ProductInfo.objects.filter(id__in=batch).select_related(
+            'shop', 'product').prefetch_related('product_parameters'))
+        categories = category_names.get_names({product_info.product.category_id for product_info in product_infos})
+        parameters = parameter_names.get_names({parameter.parameter_id for product_info in product_infos
+                                                for parameter in product_info.product_parameters.all()})
+        CatalogItem.objects.bulk_create(
+            [catalog_item(product_info, categories, parameters) for product_info in product_infos],
+            update_conflicts=True, unique_fields=['product_info'], update_fields=CATALOG_FIELDS)
+        CatalogItem.objects.filter(pk__in=batch).update(search_vector=SEARCH_VECTOR)
+
+
+def stage_goods(shop_id, staged, categories):
+    """
+    Сравнивает часть загружаемого прайса с текущими позициями магазина и записывает в строки
+    PriceImportItem итог: поля ProductInfo, вид изменения, параметры и готовую строку каталога
+    для новых и изменённых позиций. Продукты не создаются: категорий из прайса до применения
+    загрузки может ещё не быть, такие строки остаются без product. Возвращает счётчики изменений.
+    """
+    goods = [staged_item.item for staged_item in staged]
+    products = find_products({(item['name'], int(item['category'])) for item in goods})
+    parameters = parameter_names.get_ids({name for item in goods for name in item.get('parameters', {})})
+    category_ids = {int(item['category']) for item in goods}
+    names = {int(category['id']): category['name'] for category in categories}
+    names.update(category_names.get_names(category_ids - names.keys()))
+    existing = {product_info.external_id: product_info for product_info in ProductInfo.objects.filter(
+        shop_id=shop_id, external_id__in=[int(item['id']) for item in goods])}
+    current = defaultdict(dict)
+    for product_info_id, parameter_id, value in ProductInfoParameter.objects.filter(
+            product_info_id__in=[product_info.id for product_info in existing.values()]).values_list(
+            'product_info_id', 'parameter_id', 'value'):
+        current[product_info_id][parameter_id] = value
+
+    summary = Counter()
+    for staged_item in staged:
+        item = staged_item.item
+        values = product_info_values(item, products.get((item['name'], int(item['category']))))
+        item_parameters = {parameters[name]: str(value) for name, value in item.get('parameters', {}).items()}
+        product_info = existing.get(int(item['id']))
+        if product_info is None:
+            state, old = 'created', {}
+        elif any(getattr(product_info, field) != value for field, value in values.items()):
+            state, old = 'updated', current[product_info.id]
+        else:
+            state, old = 'unchanged', current[product_info.id]
+        summary[state] += 1
+        summary['parameters_created'] += len(item_parameters.keys() - old.keys())
+        summary['parameters_updated'] += sum(1 for parameter_id, value in item_parameters.items()
+                                             if parameter_id in old and old[parameter_id] != value)
+        summary['parameters_deleted'] += len(old.keys() - item_parameters.keys())
+
+        staged_item.external_id = int(item['id'])
+        staged_item.product_info_id = product_info.id if product_info else None
+        for field, value in values.items():
+            setattr(staged_item, field, value)
+        staged_item.state = state
+        staged_item.parameters = [{'parameter': parameter_id, 'value': value, 'number': parse_number(value)}
+                                  for parameter_id, value in item_parameters.items()]
+        staged_item.parameters_changed = item_parameters != old
+        staged_item.catalog = None if state == 'unchanged' and not staged_item.parameters_changed else {
+            'id': staged_item.product_info_id,
+            'model': values['model'],
+            'product': {'name': item['name'], 'category': names.get(int(item['category']))},
+            'shop': shop_id,
+            'quantity': values['quantity'],
+            'price': values['price'],
+            'price_rrc': values['price_rrc'],
+            'product_parameters': [{'parameter': name, 'value': str(value)}
+                                   for name, value in item.get('parameters', {}).items()]}
+    PriceImportItem.objects.bulk_update(staged, STAGED_FIELDS)
+    return summary
+
+
+STAGED = PriceImportItem._meta.db_table
+
+CREATE_PRODUCTS = f"""
+    INSERT INTO {Product._meta.db_table} (name, category_id)
+    SELECT DISTINCT s.item->>'name', (s.item->>'category')::bigint FROM {STAGED} s
+    WHERE s.import_key = %s AND s.product_id IS NULL
+    ON CONFLICT DO NOTHING"""
+
+LINK_PRODUCTS = f"""
+    UPDATE {STAGED} s SET product_id = p.id FROM {Product._meta.db_table} p
+    WHERE s.import_key = %s AND s.product_id IS NULL
+      AND p.name = s.item->>'name' AND p.category_id = (s.item->>'category')::bigint"""
+
+UPDATE_PRODUCT_INFOS = f"""
+    UPDATE {ProductInfo._meta.db_table} p
+    SET product_id = s.product_id, model = s.model, quantity = s.quantity, price = s.price, price_rrc = s.price_rrc
+    FROM {STAGED} s
+    WHERE s.import_key = %s AND s.state = 'updated' AND p.id = s.product_info_id"""
+
+CREATE_PRODUCT_INFOS = f"""
+    INSERT INTO {ProductInfo._meta.db_table} (model, external_id, product_id, shop_id, quantity, price, price_rrc)
+    SELECT s.model, s.external_id, s.product_id, s.shop_id, s.quantity, s.price, s.price_rrc FROM {STAGED} s
+    WHERE s.import_key = %s AND s.state = 'created'"""
+
+CREATE_PARAMETERS = f"""
+    INSERT INTO {ProductInfoParameter._meta.db_table} (product_info_id, parameter_id, value, value_number)
+    SELECT s.product_info_id, p.parameter, p.value, p.number
+    FROM {STAGED} s CROSS JOIN jsonb_to_recordset(s.parameters) AS p(parameter bigint, value text, number float)
+    WHERE s.import_key = %s AND s.parameters_changed"""
+
+UPSERT_CATALOG = f"""
+    INSERT INTO {CatalogItem._meta.db_table} (product_info_id, shop_id, category_id, shop_state, price, data)
+    SELECT s.product_info_id, s.shop_id, p.category_id, %s, s.price,
+           jsonb_set(s.catalog, '{{id}}', to_jsonb(s.product_info_id))
+    FROM {STAGED} s JOIN {Product._meta.db_table} p ON p.id = s.product_id
+    WHERE s.import_key = %s AND s.catalog IS NOT NULL
+    ON CONFLICT (product_info_id) DO UPDATE SET shop_id = EXCLUDED.shop_id, category_id = EXCLUDED.category_id,
+        shop_state = EXCLUDED.shop_state, price = EXCLUDED.price, data = EXCLUDED.data"""
+
+
+class PriceImporter:
+    """
+    Синхронизация прайса поставщика пакетами: категории и продукты разрешаются
+    через словари в памяти, параметры - через общий словарь процесса parameter_names,
+    позиции сопоставляются с существующими по (shop, external_id), и записываются
+    только вставки, изменения и удаления.
+    Для изменённых позиций тут же пересобираются строки каталога CatalogItem.
+    goods может быть генератором - в памяти держится только текущий пакет.
+    """
+
+    def __init__(self, shop, batch_size=BATCH_SIZE):
+        self.shop = shop
+        self.batch_size = batch_size
+        self.seen = set()
+        self.summary = Counter(created=0, updated=0, unchanged=0, deleted=0,
+                               parameters_created=0, parameters_updated=0, parameters_deleted=0)
+        self.rows = 0
+        self.started = monotonic()
+
+    def load_categories(self, categories):
+        self.link_categories(load_categories(categories, self.batch_size))
+
+    def link_categories(self, category_ids):
+        Category.shops.through.objects.bulk_create(
+            [Category.shops.through(category_id=category_id, shop_id=self.shop.id) for category_id in category_ids],
+            ignore_conflicts=True, batch_size=self.batch_size)
+
+    def normalize(self, goods):
+        """
+        Приводит позиции прайса к виду {external_id: (поля ProductInfo, {id параметра: значение})}.
+        """
+        products = resolve_products(goods)
+        parameters = parameter_names.get_ids({name for item in goods for name in item.get('parameters', {})})
+        return {int(item['id']): (product_info_values(item, products[(item['name'], int(item['category']))]),
+                                  {parameters[name]: str(value)
+                                   for name, value in item.get('parameters', {}).items()})
+                for item in goods}
+
+    def load_goods(self, goods):
+        for batch in chunked(goods, self.batch_size):
+            self.sync_batch(self.normalize(batch))
+            self.rows += len(batch)
+
+    def sync_batch(self, rows):
+        existing = {product_info.external_id: product_info for product_info in ProductInfo.objects.filter(
+            shop_id=self.shop.id, external_id__in=list(rows))}
+        created, changed = [], []
+        for external_id, (values, _) in rows.items():
+            product_info = existing.get(external_id)
+            if product_info is None:
+                created.append(ProductInfo(external_id=external_id, shop_id=self.shop.id, **values))
+            elif any(getattr(product_info, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(product_info, field, value)
+                changed.append(product_info)
+        ProductInfo.objects.bulk_create(created, batch_size=self.batch_size)
+        ProductInfo.objects.bulk_update(changed, PRODUCT_INFO_FIELDS, batch_size=self.batch_size)
+        self.seen.update(rows)
+        self.summary['created'] += len(created)
+        self.summary['updated'] += len(changed)
+        self.summary['unchanged'] += len(existing) - len(changed)
+        changed_ids = [product_info.id for product_info in [*created, *changed]]
+
+        product_infos = {product_info.external_id: product_info.id
+                         for product_info in [*existing.values(), *created]}
+        current = {(parameter.product_info_id, parameter.parameter_id): parameter
+                   for parameter in ProductInfoParameter.objects.filter(
+                       product_info_id__in=[product_info.id for product_info in existing.values()])}
+        created, changed = [], []
+        for external_id, (_, parameters) in rows.items():
+            for parameter_id, value in parameters.items():
+                key = (product_infos[external_id], parameter_id)
+                parameter = current.pop(key, None)
+                if parameter is None:
+                    created.append(ProductInfoParameter(product_info_id=key[0], parameter_id=key[1], value=value,
+                                                        value_number=parse_number(value)))
+                elif parameter.value != value:
+                    parameter.value = value
+                    parameter.value_number = parse_number(value)
+                    changed.append(parameter)
+        ProductInfoParameter.objects.bulk_create(created, batch_size=self.batch_size)
+        ProductInfoParameter.objects.bulk_update(changed, ['value', 'value_number'], batch_size=self.batch_size)
+        ProductInfoParameter.objects.filter(id__in=[parameter.id for parameter in current.values()]).delete()
+        self.summary['parameters_created'] += len(created)
+        self.summary['parameters_updated'] += len(changed)
+        self.summary['parameters_deleted'] += len(current)
+
+        refresh_catalog({*changed_ids, *(parameter.product_info_id for parameter in [*created, *changed,
+                                                                                     *current.values()])},
+                        self.batch_size)
+
+    def finish(self):
+        """
+        Удаляет позиции магазина, которых нет в прайсе. Корзины, из которых при этом
+        каскадом уходят строки, передаются в сигнале в summary['baskets'].
+        """
+        removed = [product_info_id for product_info_id, external_id in ProductInfo.objects.filter(
+            shop_id=self.shop.id).values_list('id', 'external_id') if external_id not in self.seen]
+        baskets = set()
+        for batch in chunked(removed, self.batch_size):
+            baskets.update(basket_ids(ProductInfo.objects.filter(id__in=batch)))
+            ProductInfo.objects.filter(id__in=batch).delete()
+        self.summary['deleted'] += len(removed)
+        price_list_imported.send(sender=self.__class__, shop_id=self.shop.id,
+                                 summary={**self.summary, 'baskets': sorted(baskets)})
+        return self.stats()
+
+    def apply_staged(self, import_key, summaries):
+        """
+        Применяет прайс, подготовленный stage_goods, запросами сразу по всем строкам загрузки:
+        создаёт недостающие продукты, обновляет, добавляет и удаляет позиции, заменяет
+        изменившиеся параметры и строки каталога. summaries - счётчики stage_goods по частям.
+        """
+        staged = PriceImportItem.objects.filter(import_key=import_key)
+        for summary in summaries:
+            self.summary.update(summary)
+        self.rows = staged.count()
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_PRODUCTS, [import_key])
+            cursor.execute(LINK_PRODUCTS, [import_key])
+            cursor.execute(UPDATE_PRODUCT_INFOS, [import_key])
+            cursor.execute(CREATE_PRODUCT_INFOS, [import_key])
+            staged.filter(state='created').update(product_info_id=Subquery(ProductInfo.objects.filter(
+                shop_id=OuterRef('shop_id'), external_id=OuterRef('external_id')).values('id')[:1]))
+            ProductInfoParameter.objects.filter(product_info_id__in=staged.filter(
+                parameters_changed=True, state__in=['updated', 'unchanged']).values('product_info_id')).delete()
+            cursor.execute(CREATE_PARAMETERS, [import_key])
+            cursor.execute(UPSERT_CATALOG, [self.shop.state, import_key])
+        CatalogItem.objects.filter(pk__in=staged.filter(catalog__isnull=False).values('product_info_id')).update(
+            search_vector=SEARCH_VECTOR)
+
+        removed = ProductInfo.objects.filter(shop_id=self.shop.id).exclude(external_id__in=staged.values('external_id'))
+        baskets = sorted(basket_ids(removed))
+        self.summary['deleted'] += removed.delete()[1].get(ProductInfo._meta.label, 0)
+        price_list_imported.send(sender=self.__class__, shop_id=self.shop.id,
+                                 summary={**self.summary, 'baskets': baskets})
+        return self.stats()
+
+    def stats(self):
+        elapsed = monotonic() - self.started
+        return {'shop_id': self.shop.id,
+                'rows': self.rows,
+                **self.summary,
+                'seconds': round(elapsed, 3),
+                'rows_per_second': round(self.rows / elapsed) if elapsed else self.rows}
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicates(apps, schema_editor):
+    Product = apps.get_model('ordering_goods', 'Product')
+    ProductInfo = apps.get_model('ordering_goods', 'ProductInfo')
+    Parameter = apps.get_model('ordering_goods', 'Parameter')
+    ProductInfoParameter = apps.get_model('ordering_goods', 'ProductInfoParameter')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+    kept = {}
+    for product_id, name, category_id in Product.objects.order_by('id').values_list('id', 'name', 'category_id'):
+        target = kept.setdefault((name, category_id), product_id)
+        if target == product_id:
+            continue
+        for product_info in ProductInfo.objects.filter(product_id=product_id):
+            if ProductInfo.objects.filter(product_id=target, shop_id=product_info.shop_id,
+                                          external_id=product_info.external_id).exists():
+                product_info.delete()
+            else:
+                ProductInfo.objects.filter(id=product_info.id).update(product_id=target)
+        Product.objects.filter(id=product_id).delete()
+
+    kept = {}
+    for parameter_id, name in Parameter.objects.order_by('id').values_list('id', 'name'):
+        target = kept.setdefault(name, parameter_id)
+        if target == parameter_id:
+            continue
+        ProductInfoParameter.objects.filter(
+            parameter_id=parameter_id,
+            product_info_id__in=ProductInfoParameter.objects.filter(parameter_id=target).values('product_info_id'),
+        ).delete()
+        ProductInfoParameter.objects.filter(parameter_id=parameter_id).update(parameter_id=target)
+        Parameter.objects.filter(id=parameter_id).delete()
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceImportItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('import_key', models.CharField(db_index=True, max_length=32, verbose_name='Ключ загрузки')),
+                ('item', models.JSONField(verbose_name='Позиция прайса')),
+                ('parameters', models.JSONField(blank=True, null=True, verbose_name='Параметры')),
+            ],
+            options={
+                'verbose_name': 'Позиция загружаемого прайса',
+                'verbose_name_plural': 'Список позиций загружаемых прайсов',
+            },
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='parameter',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_parameter'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('name', 'category'), name='unique_product'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ordering_goods.product', verbose_name='Продукт'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_import_items', to='ordering_goods.shop', verbose_name='Магазин'),
+        ),
+    ]
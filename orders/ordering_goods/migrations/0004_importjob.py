@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ordering_goods', '0003_priceimportitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(verbose_name='Ссылка')),
+                ('state', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('finished', 'Завершена'), ('failed', 'Ошибка')], default='queued', max_length=15, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Обработано позиций')),
+                ('chunks', models.PositiveIntegerField(default=0, verbose_name='Частей')),
+                ('chunks_done', models.PositiveIntegerField(default=0, verbose_name='Обработано частей')),
+                ('rows_per_second', models.PositiveIntegerField(blank=True, null=True, verbose_name='Позиций в секунду')),
+                ('summary', models.JSONField(blank=True, default=dict, verbose_name='Итоги')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('shop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to='ordering_goods.shop', verbose_name='Магазин')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка прайса',
+                'verbose_name_plural': 'Список загрузок прайсов',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
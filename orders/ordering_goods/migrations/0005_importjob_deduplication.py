@@ -0,0 +1,31 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0004_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Хэш содержимого'),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='state',
+            field=models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('finished', 'Завершена'), ('skipped', 'Прайс не изменился'), ('superseded', 'Заменена более новой'), ('failed', 'Ошибка')], default='queued', max_length=15, verbose_name='Статус'),
+        ),
+        migrations.AddConstraint(
+            model_name='importjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'queued')), fields=('user',), name='unique_queued_import'),
+        ),
+        migrations.AddConstraint(
+            model_name='importjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'running')), fields=('user',), name='unique_running_import'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0005_importjob_deduplication'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='price_etag',
+            field=models.CharField(blank=True, max_length=255, verbose_name='ETag прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='price_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Хэш прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='price_last_modified',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Last-Modified прайса'),
+        ),
+    ]
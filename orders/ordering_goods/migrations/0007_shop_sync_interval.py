@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0006_shop_price_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='next_sync_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Следующая синхронизация прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='sync_interval',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Интервал синхронизации прайса (мин)'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_catalog(apps, schema_editor):
+    ProductInfo = apps.get_model('ordering_goods', 'ProductInfo')
+    CatalogItem = apps.get_model('ordering_goods', 'CatalogItem')
+    items = []
+    for product_info in ProductInfo.objects.select_related('shop', 'product__category').prefetch_related(
+            'product_parameters__parameter').iterator(chunk_size=1000):
+        items.append(CatalogItem(
+            product_info_id=product_info.id, shop_id=product_info.shop_id,
+            category_id=product_info.product.category_id, shop_state=product_info.shop.state,
+            price=product_info.price,
+            data={'id': product_info.id, 'model': product_info.model,
+                  'product': {'name': product_info.product.name, 'category': product_info.product.category.name},
+                  'shop': product_info.shop_id, 'quantity': product_info.quantity, 'price': product_info.price,
+                  'price_rrc': product_info.price_rrc,
+                  'product_parameters': [{'parameter': parameter.parameter.name, 'value': parameter.value}
+                                         for parameter in product_info.product_parameters.all()]}))
+        if len(items) == 1000:
+            CatalogItem.objects.bulk_create(items)
+            items = []
+    CatalogItem.objects.bulk_create(items)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0007_shop_sync_interval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogItem',
+            fields=[
+                ('product_info', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='catalog_item', serialize=False, to='ordering_goods.productinfo', verbose_name='Информация о продукте')),
+                ('shop_state', models.BooleanField(default=True, verbose_name='Статус получения заказов')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('data', models.JSONField(verbose_name='Представление в каталоге')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_items', to='ordering_goods.category', verbose_name='Категория')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_items', to='ordering_goods.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Позиция каталога',
+                'verbose_name_plural': 'Каталог',
+                'indexes': [models.Index(fields=['price', 'product_info'], name='catalog_item_price_idx')],
+            },
+        ),
+        migrations.RunPython(fill_catalog, migrations.RunPython.noop),
+    ]
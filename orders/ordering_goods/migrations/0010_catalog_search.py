@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+from django.db.models.fields.json import KT
+
+
+def fill_search_vector(apps, schema_editor):
+    apps.get_model('ordering_goods', 'CatalogItem').objects.update(
+        search_vector=django.contrib.postgres.search.SearchVector(KT('data__product__name'), weight='A',
+                                                                  config='russian') +
+        django.contrib.postgres.search.SearchVector(KT('data__model'), weight='B', config='russian'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0009_catalogitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogitem',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='catalogitem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='catalog_item_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfoparameter',
+            index=models.Index(fields=['parameter', 'value', 'product_info'], name='product_parameter_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfoparameter',
+            index=models.Index(fields=['product_info', 'parameter', 'value'], name='product_parameter_facet_idx'),
+        ),
+    ]
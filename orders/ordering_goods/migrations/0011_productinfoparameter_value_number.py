@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:37
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Replace, Trim
+
+
+def fill_value_number(apps, schema_editor):
+    apps.get_model('ordering_goods', 'ProductInfoParameter').objects.filter(
+        value__regex=r'^\s*-?\d+([.,]\d+)?\s*$').update(
+        value_number=Cast(Replace(Trim('value'), models.Value(','), models.Value('.')), models.FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0010_catalog_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinfoparameter',
+            name='value_number',
+            field=models.FloatField(blank=True, null=True, verbose_name='Числовое значение'),
+        ),
+        migrations.RunPython(fill_value_number, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productinfoparameter',
+            index=models.Index(condition=models.Q(('value_number__isnull', False)), fields=['parameter', 'value_number', 'product_info'], name='product_parameter_number_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ordering_goods', '0011_productinfoparameter_value_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='catalog',
+            field=models.JSONField(blank=True, null=True, verbose_name='Представление в каталоге'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='external_id',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Внешний ID'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='model',
+            field=models.CharField(blank=True, max_length=80, verbose_name='Модель'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='parameters_changed',
+            field=models.BooleanField(default=False, verbose_name='Параметры изменены'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='price',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Цена'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='price_rrc',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Рекомендуемая розничная цена'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='product_info',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_import_items', to='ordering_goods.productinfo', verbose_name='Информация о продукте'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='quantity',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Количество'),
+        ),
+        migrations.AddField(
+            model_name='priceimportitem',
+            name='state',
+            field=models.CharField(blank=True, choices=[('created', 'Новая позиция'), ('updated', 'Изменённая позиция'), ('unchanged', 'Позиция без изменений')], max_length=10, verbose_name='Изменение'),
+        ),
+    ]
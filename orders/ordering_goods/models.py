@@ -1,12 +1,39 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from users_auth.models import User
 
 
+SEARCH_CONFIG = 'russian'
+
+IMPORT_STATES = (
+    ('queued', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('finished', 'Завершена'),
+    ('skipped', 'Прайс не изменился'),
+    ('superseded', 'Заменена более новой'),
+    ('failed', 'Ошибка'),
+)
+
+STAGED_STATES = (
+    ('created', 'Новая позиция'),
+    ('updated', 'Изменённая позиция'),
+    ('unchanged', 'Позиция без изменений'),
+)
+
+
 class Shop(models.Model):
     name = models.CharField(max_length=50, verbose_name='Название')
     url = models.URLField(verbose_name='Ссылка', null=True, blank=True)
     user = models.OneToOneField(User, verbose_name='Пользователь', blank=True, null=True, on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='Статус получения заказов', default=True)
+    price_etag = models.CharField(verbose_name='ETag прайса', max_length=255, blank=True)
+    price_last_modified = models.CharField(verbose_name='Last-Modified прайса', max_length=64, blank=True)
+    price_hash = models.CharField(verbose_name='Хэш прайса', max_length=64, blank=True)
+    sync_interval = models.PositiveIntegerField(verbose_name='Интервал синхронизации прайса (мин)',
+                                                null=True, blank=True)
+    next_sync_at = models.DateTimeField(verbose_name='Следующая синхронизация прайса', null=True, blank=True,
+                                        db_index=True)
 
     class Meta:
         verbose_name = 'Магазин'
@@ -39,6 +66,7 @@ class Product(models.Model):
         verbose_name = 'Продукт'
         verbose_name_plural = 'Список продуктов'
         ordering = ('-name',)
+        constraints = [models.UniqueConstraint(fields=['name', 'category'], name='unique_product'),]
 
     def __str__(self):
         return self.name
@@ -69,6 +97,7 @@ class Parameter(models.Model):
         verbose_name = 'Имя параметра'
         verbose_name_plural = 'Списко имен параметров'
         ordering = ('-name',)
+        constraints = [models.UniqueConstraint(fields=['name'], name='unique_parameter'),]
 
     def __str__(self):
         return self.name
@@ -81,9 +110,87 @@ class ProductInfoParameter(models.Model):
     parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='product_parameters',
                                   blank=True, on_delete=models.CASCADE)
     value = models.CharField(verbose_name='Значение', max_length=100)
+    value_number = models.FloatField(verbose_name='Числовое значение', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Параметр'
         verbose_name_plural = 'Список параметров'
         constraints = [models.UniqueConstraint(fields=['product_info', 'parameter'],
-                                               name='unique_product_parameter'),]
\ No newline at end of file
+                                               name='unique_product_parameter'),]
+        indexes = [models.Index(fields=['parameter', 'value', 'product_info'], name='product_parameter_value_idx'),
+                   models.Index(fields=['product_info', 'parameter', 'value'], name='product_parameter_facet_idx'),
+                   models.Index(fields=['parameter', 'value_number', 'product_info'],
+                                condition=models.Q(value_number__isnull=False),
+                                name='product_parameter_number_idx'),]
+
+
+class CatalogItem(models.Model):
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Информация о продукте', primary_key=True,
+                                        related_name='catalog_item', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='catalog_items', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='catalog_items',
+                                 on_delete=models.CASCADE)
+    shop_state = models.BooleanField(verbose_name='Статус получения заказов', default=True)
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    data = models.JSONField(verbose_name='Представление в каталоге')
+    search_vector = SearchVectorField(verbose_name='Поисковый вектор', null=True)
+
+    class Meta:
+        verbose_name = 'Позиция каталога'
+        verbose_name_plural = 'Каталог'
+        indexes = [models.Index(fields=['price', 'product_info'], name='catalog_item_price_idx'),
+                   GinIndex(fields=['search_vector'], name='catalog_item_search_idx'),]
+
+
+class PriceImportItem(models.Model):
+    import_key = models.CharField(max_length=32, verbose_name='Ключ загрузки', db_index=True)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='price_import_items',
+                             on_delete=models.CASCADE)
+    item = models.JSONField(verbose_name='Позиция прайса')
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ID', null=True, blank=True)
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', null=True, blank=True,
+                                     related_name='price_import_items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, verbose_name='Продукт', null=True, blank=True, on_delete=models.CASCADE)
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    quantity = models.PositiveIntegerField(verbose_name='Количество', null=True, blank=True)
+    price = models.PositiveIntegerField(verbose_name='Цена', null=True, blank=True)
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена', null=True, blank=True)
+    state = models.CharField(verbose_name='Изменение', choices=STAGED_STATES, max_length=10, blank=True)
+    parameters = models.JSONField(verbose_name='Параметры', null=True, blank=True)
+    parameters_changed = models.BooleanField(verbose_name='Параметры изменены', default=False)
+    catalog = models.JSONField(verbose_name='Представление в каталоге', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Позиция загружаемого прайса'
+        verbose_name_plural = 'Список позиций загружаемых прайсов'
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='import_jobs',
+                             on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='import_jobs', null=True, blank=True,
+                             on_delete=models.SET_NULL)
+    url = models.URLField(verbose_name='Ссылка')
+    content_hash = models.CharField(verbose_name='Хэш содержимого', max_length=64, blank=True)
+    state = models.CharField(verbose_name='Статус', choices=IMPORT_STATES, max_length=15, default='queued')
+    created_at = models.DateTimeField(verbose_name='Создана', auto_now_add=True)
+    started_at = models.DateTimeField(verbose_name='Начата', null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name='Завершена', null=True, blank=True)
+    rows = models.PositiveIntegerField(verbose_name='Обработано позиций', default=0)
+    chunks = models.PositiveIntegerField(verbose_name='Частей', default=0)
+    chunks_done = models.PositiveIntegerField(verbose_name='Обработано частей', default=0)
+    rows_per_second = models.PositiveIntegerField(verbose_name='Позиций в секунду', null=True, blank=True)
+    summary = models.JSONField(verbose_name='Итоги', default=dict, blank=True)
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Загрузка прайса'
+        verbose_name_plural = 'Список загрузок прайсов'
+        ordering = ('-created_at',)
+        constraints = [models.UniqueConstraint(fields=['user'], condition=models.Q(state='queued'),
+                                               name='unique_queued_import'),
+                       models.UniqueConstraint(fields=['user'], condition=models.Q(state='running'),
+                                               name='unique_running_import'),]
+
+    def __str__(self):
+        return f'{self.url} {self.state}'
@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProductInfoPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору: следующая страница выбирается условием по ключу
+    сортировки, а не смещением, поэтому дальние страницы отдаются так же быстро, как первая.
+    """
+    page_size = 40
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('pk',)
+    orderings = {'id': ('pk',), 'price': ('price', 'pk'), '-price': ('-price', '-pk')}
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get('ordering'), self.ordering)
@@ -0,0 +1,97 @@
+from collections import namedtuple
+import ujson
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.events import MappingEndEvent, MappingStartEvent, SequenceEndEvent, SequenceStartEvent
+from yaml.resolver import Resolver
+
+
+JSON_LINES_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines')
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+PriceList = namedtuple('PriceList', ('shop', 'categories', 'goods'))
+
+HEADER_KEYS = ('shop', 'categories')
+
+HEADER_ORDER_ERROR = 'Ключи shop и categories должны идти в прайсе раньше goods'
+
+
+if yaml.__with_libyaml__:
+    from yaml.cyaml import CParser
+
+    class StreamLoader(CParser, Composer, SafeConstructor, Resolver):
+        """
+        Событийный парсер libyaml, из событий которого узлы собираются по одному,
+        а не всем документом сразу.
+        """
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+else:
+    StreamLoader = yaml.SafeLoader
+
+
+def _expect(loader, event_class):
+    if not loader.check_event(event_class):
+        raise ValueError('Неверный формат прайса')
+    return loader.get_event()
+
+
+def _next_value(loader):
+    return loader.construct_document(loader.compose_node(None, None))
+
+
+def _iter_yaml_goods(loader):
+    _expect(loader, SequenceStartEvent)
+    while not loader.check_event(SequenceEndEvent):
+        yield _next_value(loader)
+    loader.get_event()
+    while not loader.check_event(MappingEndEvent):
+        if _next_value(loader) in HEADER_KEYS:
+            raise ValueError(HEADER_ORDER_ERROR)
+        _next_value(loader)
+
+
+def read_yaml(stream):
+    """
+    Читает прайс из потока: shop и categories собираются целиком,
+    а goods отдаются генератором по одной позиции.
+    Ключи shop и categories должны идти в файле раньше goods, иначе при разборе
+    поднимается ValueError.
+    """
+    loader = StreamLoader(stream)
+    loader.get_event()
+    loader.get_event()
+    _expect(loader, MappingStartEvent)
+    header = {}
+    goods = iter(())
+    while not loader.check_event(MappingEndEvent):
+        key = _next_value(loader)
+        if key == 'goods':
+            goods = _iter_yaml_goods(loader)
+            break
+        header[key] = _next_value(loader)
+    if 'shop' not in header:
+        raise ValueError(HEADER_ORDER_ERROR if loader.check_event(SequenceStartEvent) else 'Неверный формат прайса')
+    return PriceList(header['shop'], header.get('categories', []), goods)
+
+
+def read_json_lines(lines):
+    """
+    Первая строка - объект с ключами shop и categories, каждая следующая - одна позиция goods.
+    """
+    lines = (line for line in lines if line.strip())
+    header = ujson.loads(next(lines, '{}'))
+    if 'shop' not in header:
+        raise ValueError('Неверный формат прайса')
+    return PriceList(header['shop'], header.get('categories', []), (ujson.loads(line) for line in lines))
+
+
+def read_price_list(stream, content_type='', url=''):
+    if content_type.split(';')[0].strip() in JSON_LINES_TYPES or url.split('?')[0].endswith(JSON_LINES_EXTENSIONS):
+        return read_json_lines(stream)
+    return read_yaml(stream)
@@ -1,5 +1,14 @@
+import re
+from django.utils import timezone
 from rest_framework import serializers
 from .models import *
+from .importer import parse_number
+from .cache import category_names, parameter_names
+
+
+MIN_SYNC_INTERVAL = 15
+
+PARAMETER_FILTER = re.compile(r'^param_(\d+)(?:_(min|max))?$')
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -18,8 +27,21 @@ class ShopSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', )
 
 
+class DictionaryNameField(serializers.ReadOnlyField):
+    """
+    Название записи справочника по id из словаря процесса, без запроса связанной модели.
+    """
+
+    def __init__(self, dictionary, **kwargs):
+        self.dictionary = dictionary
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.dictionary.get_name(value)
+
+
 class ProductSerializer(serializers.ModelSerializer):
-    category = serializers.StringRelatedField()
+    category = DictionaryNameField(category_names, source='category_id')
 
     class Meta:
         model = Product
@@ -27,7 +49,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class ProductParameterSerializer(serializers.ModelSerializer):
-    parameter = serializers.StringRelatedField()
+    parameter = DictionaryNameField(parameter_names, source='parameter_id')
 
     class Meta:
         model = ProductInfoParameter
@@ -41,4 +63,56 @@ class ProductInfoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductInfo
         fields = ('id', 'model', 'product', 'shop', 'quantity', 'price', 'price_rrc', 'product_parameters',)
-        read_only_fields = ('id',)
\ No newline at end of file
+        read_only_fields = ('id',)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'url', 'content_hash', 'shop', 'state', 'created_at', 'started_at', 'finished_at', 'seconds',
+                  'rows', 'chunks', 'chunks_done', 'rows_per_second', 'summary', 'error', )
+        read_only_fields = fields
+
+    def get_seconds(self, obj):
+        if obj.started_at:
+            return round(((obj.finished_at or timezone.now()) - obj.started_at).total_seconds(), 3)
+
+
+class ShopSyncSerializer(serializers.ModelSerializer):
+    sync_interval = serializers.IntegerField(min_value=MIN_SYNC_INTERVAL, allow_null=True)
+
+    class Meta:
+        model = Shop
+        fields = ('id', 'url', 'sync_interval', 'next_sync_at', )
+        read_only_fields = ('id', 'url', 'next_sync_at', )
+
+
+class ProductSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, max_length=200)
+    shop_id = serializers.IntegerField(required=False)
+    category_id = serializers.IntegerField(required=False)
+    price_min = serializers.IntegerField(required=False, min_value=0)
+    price_max = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        """
+        Собирает фильтры по параметрам: param_<id>=<значение> и числовые границы param_<id>_min, param_<id>_max.
+        """
+        attrs['parameters'] = []
+        for key in self.initial_data:
+            match = PARAMETER_FILTER.match(key)
+            if not match:
+                continue
+            parameter_id, bound = match.groups()
+            values = self.initial_data.getlist(key)
+            if not bound:
+                attrs['parameters'].append((int(parameter_id), 'value__in', values))
+                continue
+            number = parse_number(values[0])
+            if number is None:
+                raise serializers.ValidationError({key: 'Требуется число'})
+            attrs['parameters'].append((int(parameter_id), 'value_number__gte' if bound == 'min'
+                                        else 'value_number__lte', number))
+        return attrs
@@ -0,0 +1,10 @@
+from django.dispatch import Signal, receiver
+from .cache import bump_catalog_version
+
+
+price_list_imported = Signal()
+
+
+@receiver(price_list_imported)
+def catalog_changed(shop_id, **kwargs):
+    bump_catalog_version(shop_id)
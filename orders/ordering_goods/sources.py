@@ -0,0 +1,43 @@
+from collections import namedtuple
+from hashlib import sha256
+from tempfile import SpooledTemporaryFile
+from requests import get
+
+
+REQUEST_TIMEOUT = 30
+
+CHUNK_SIZE = 64 * 1024
+
+SPOOL_SIZE = 1024 * 1024
+
+Download = namedtuple('Download', ('file', 'content_type', 'url', 'content_hash', 'etag', 'last_modified'))
+
+
+def download(url, etag='', last_modified=''):
+    """
+    Скачивает прайс частями во временный файл (на диск, если он больше SPOOL_SIZE),
+    попутно считая sha256 содержимого. При переданных etag или last_modified запрос
+    условный, и если прайс не изменился (304), возвращается None.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    content_hash = sha256()
+    file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        with get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            if response.status_code == 304:
+                file.close()
+                return None
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                content_hash.update(chunk)
+                file.write(chunk)
+    except Exception:
+        file.close()
+        raise
+    file.seek(0)
+    return Download(file, response.headers.get('Content-Type', ''), response.url, content_hash.hexdigest(),
+                    response.headers.get('ETag', ''), response.headers.get('Last-Modified', ''))
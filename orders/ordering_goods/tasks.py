@@ -1,31 +1,220 @@
-from django.http import JsonResponse
+import random
+from itertools import chain
+from datetime import timedelta
+from uuid import uuid4
+from celery import chord
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
 from orders.celery import app
-from requests import get
-from yaml import load, Loader
+from .importer import PriceImporter, chunked, logger, stage_goods
 from .models import *
+from .parsers import read_price_list
+from .sources import download
+
+
+CHUNK_ROWS = 5000
+
+RETRY_COUNTDOWN = 30
+
+JOB_TIMEOUT = timedelta(hours=1)
+
+RESYNC_BATCH = 100
+
+RESYNC_PERIOD = 60
+
+
+def log_stats(stats):
+    logger.info('Прайс магазина %(shop_id)s загружен: %(rows)s позиций за %(seconds)s с '
+                '(%(rows_per_second)s позиций/с), добавлено %(created)s, изменено %(updated)s, '
+                'удалено %(deleted)s', stats)
+    return stats
+
+
+def update_job(job_id, **fields):
+    if job_id:
+        ImportJob.objects.filter(id=job_id).update(**fields)
+
+
+def finish_job(job_id, stats):
+    if job_id:
+        job = ImportJob.objects.get(id=job_id)
+        job.state = 'finished'
+        job.finished_at = timezone.now()
+        job.rows = stats['rows']
+        seconds = (job.finished_at - job.started_at).total_seconds() if job.started_at else stats['seconds']
+        job.rows_per_second = round(job.rows / seconds) if seconds else job.rows
+        job.summary = {key: value for key, value in stats.items()
+                       if key not in ('shop_id', 'rows', 'seconds', 'rows_per_second')}
+        job.save(update_fields=['state', 'finished_at', 'rows', 'rows_per_second', 'summary'])
+    return log_stats(stats)
+
+
+def enqueue_price_import(user_id, url, countdown=None):
+    """
+    Ставит загрузку прайса в очередь. Повторный запрос той же ссылки, пока загрузка
+    ещё в очереди, возвращает уже созданную ImportJob, запрос другой ссылки заменяет её.
+    """
+    try:
+        with transaction.atomic():
+            queued = ImportJob.objects.select_for_update().filter(user_id=user_id, state='queued').first()
+            if queued and queued.url == url:
+                return queued
+            ImportJob.objects.filter(user_id=user_id, state='queued').update(state='superseded',
+                                                                             finished_at=timezone.now())
+            job = ImportJob.objects.create(user_id=user_id, url=url)
+            transaction.on_commit(lambda: price_loader.apply_async((url, user_id, job.id), countdown=countdown))
+            return job
+    except IntegrityError:
+        return ImportJob.objects.get(user_id=user_id, state='queued')
+
+
+def start_job(job_id, user_id):
+    ImportJob.objects.filter(user_id=user_id, state='running',
+                             started_at__lt=timezone.now() - JOB_TIMEOUT).update(
+        state='failed', finished_at=timezone.now(), error='Превышено время выполнения')
+    with transaction.atomic():
+        return ImportJob.objects.filter(id=job_id, state='queued').update(state='running',
+                                                                          started_at=timezone.now())
+
+
+def last_import_hash(user_id):
+    return ImportJob.objects.filter(user_id=user_id, state='finished').order_by('-finished_at').values_list(
+        'content_hash', flat=True).first()
+
+
+def skip_job(job_id):
+    update_job(job_id, state='skipped', finished_at=timezone.now())
+    return {'job': job_id, 'state': 'skipped'}
+
+
+@app.task(bind=True, max_retries=None)
+def price_loader(self, url, user_id, job_id=None):
+    """
+    Прайс до CHUNK_ROWS позиций загружается в этой же задаче. Прайс больше
+    складывается в PriceImportItem, задачи price_chunk_loader параллельно сравнивают
+    свои части с текущими позициями, а price_import_finalizer одной транзакцией
+    загружает категории и применяет подготовленные строки.
+    Ход загрузки записывается в ImportJob с id job_id. Одновременно у пользователя
+    выполняется только одна загрузка. Для загрузки с job_id прайс запрашивается
+    условно по сохранённым у магазина ETag и Last-Modified, и если он не изменился
+    или совпадает по хэшу с последней завершённой загрузкой пользователя, с какой бы
+    ссылки она ни была, загрузка пропускается.
+    """
+    if job_id:
+        try:
+            if not start_job(job_id, user_id):
+                return {'job': job_id, 'state': ImportJob.objects.get(id=job_id).state}
+        except IntegrityError:
+            raise self.retry(countdown=RETRY_COUNTDOWN)
+    try:
+        cached = Shop.objects.filter(user_id=user_id, url=url).first() if job_id else None
+        if cached:
+            price_file = download(url, cached.price_etag, cached.price_last_modified)
+        else:
+            price_file = download(url)
+        if price_file is None:
+            return skip_job(job_id)
+        source = {'url': url, 'price_etag': price_file.etag, 'price_last_modified': price_file.last_modified,
+                  'price_hash': price_file.content_hash}
+        with price_file.file:
+            update_job(job_id, content_hash=price_file.content_hash)
+            if job_id and last_import_hash(user_id) == price_file.content_hash:
+                Shop.objects.filter(user_id=user_id).update(**source)
+                return skip_job(job_id)
+            price_list = read_price_list(price_file.file, price_file.content_type, price_file.url)
+            shop, _ = Shop.objects.get_or_create(user_id=user_id, name=price_list.shop)
+            update_job(job_id, shop_id=shop.id)
+            chunks = chunked(price_list.goods, CHUNK_ROWS)
+            first_chunk = next(chunks, [])
+            second_chunk = next(chunks, None)
+            if second_chunk is None:
+                with transaction.atomic():
+                    importer = PriceImporter(Shop.objects.select_for_update().get(id=shop.id))
+                    importer.load_categories(price_list.categories)
+                    importer.load_goods(first_chunk)
+                    stats = importer.finish()
+                    Shop.objects.filter(id=shop.id).update(**source)
+                return finish_job(job_id, stats)
+
+            import_key = uuid4().hex
+            ranges = []
+            try:
+                for chunk in chain((first_chunk, second_chunk), chunks):
+                    staged = PriceImportItem.objects.bulk_create(
+                        [PriceImportItem(import_key=import_key, shop_id=shop.id, item=item) for item in chunk])
+                    ranges.append((staged[0].id, staged[-1].id))
+            except Exception:
+                PriceImportItem.objects.filter(import_key=import_key).delete()
+                raise
+    except Exception as error:
+        update_job(job_id, state='failed', finished_at=timezone.now(), error=str(error))
+        raise
+
+    update_job(job_id, chunks=len(ranges))
+    chord([price_chunk_loader.si(import_key, shop.id, first_id, last_id, price_list.categories, job_id)
+           for first_id, last_id in ranges])(
+        price_import_finalizer.s(import_key, shop.id, price_list.categories, job_id, source).on_error(
+            price_import_cleanup.si(import_key, job_id)))
+    return {'shop_id': shop.id, 'import_key': import_key, 'chunks': len(ranges)}
+
+
+@app.task
+def price_chunk_loader(import_key, shop_id, first_id, last_id, categories, job_id=None):
+    try:
+        staged = list(PriceImportItem.objects.filter(import_key=import_key, id__range=(first_id, last_id)))
+        summary = stage_goods(shop_id, staged, categories)
+    except Exception as error:
+        update_job(job_id, error=str(error))
+        raise
+    update_job(job_id, chunks_done=F('chunks_done') + 1, rows=F('rows') + len(staged))
+    return summary
+
+
+@app.task
+def price_import_finalizer(summaries, import_key, shop_id, categories, job_id=None, source=None):
+    try:
+        with transaction.atomic():
+            shop = Shop.objects.select_for_update().get(id=shop_id)
+            importer = PriceImporter(shop)
+            importer.load_categories(categories)
+            stats = importer.apply_staged(import_key, summaries)
+            PriceImportItem.objects.filter(import_key=import_key).delete()
+            if source:
+                Shop.objects.filter(id=shop_id).update(**source)
+    except Exception as error:
+        update_job(job_id, error=str(error))
+        raise
+    return finish_job(job_id, stats)
+
+
+@app.task
+def price_import_cleanup(import_key, job_id=None):
+    PriceImportItem.objects.filter(import_key=import_key).delete()
+    update_job(job_id, state='failed', finished_at=timezone.now())
+
+
+def next_sync_at(interval, start=None):
+    """
+    Время следующей синхронизации со случайным сдвигом до 10% интервала,
+    чтобы магазины с одинаковым интервалом не синхронизировались одновременно.
+    """
+    interval = timedelta(minutes=interval)
+    return (start or timezone.now()) + interval + random.random() * interval / 10
 
 
 @app.task
-def price_loader(url, user_id):
-    stream = get(url).content
-    data = load(stream, Loader=Loader)
-    shop, _ = Shop.objects.get_or_create(user_id=user_id, name=data['shop'])
-    for category in data['categories']:
-        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-        category_object.shops.add(shop.id)
-        category_object.save()
-    ProductInfo.objects.filter(shop_id=shop.id).delete()
-    for item in data['goods']:
-        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-        product_info = ProductInfo.objects.create(product_id=product.id,
-                                                  external_id=item['id'],
-                                                  model=item['model'],
-                                                  price=item['price'],
-                                                  price_rrc=item['price_rrc'],
-                                                  quantity=item['quantity'],
-                                                  shop_id=shop.id)
-        for name, value in item['parameters'].items():
-            parameter_object, _ = Parameter.objects.get_or_create(name=name)
-            ProductInfoParameter.objects.create(product_info_id=product_info.id,
-                                                parameter_id=parameter_object.id,
-                                                value=value)
\ No newline at end of file
+def schedule_price_resync():
+    """
+    Запускается Celery beat раз в RESYNC_PERIOD секунд и ставит в очередь загрузку прайсов
+    магазинов, у которых подошло время синхронизации, равномерно распределяя их по периоду.
+    """
+    with transaction.atomic():
+        shops = list(Shop.objects.select_for_update(skip_locked=True).filter(
+            sync_interval__isnull=False, next_sync_at__lte=timezone.now(), url__isnull=False,
+            user__isnull=False, user__is_active=True).order_by('next_sync_at')[:RESYNC_BATCH])
+        for number, shop in enumerate(shops):
+            enqueue_price_import(shop.user_id, shop.url, countdown=RESYNC_PERIOD * number / len(shops))
+            shop.next_sync_at = next_sync_at(shop.sync_interval)
+        Shop.objects.bulk_update(shops, ['next_sync_at'])
+    return len(shops)
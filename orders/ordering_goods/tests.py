@@ -1,9 +1,45 @@
+import io
+from datetime import timedelta
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework.authtoken.models import Token
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
 from ordering_goods.views import *
-from ordering_goods.tasks import price_loader
+from ordering_goods.tasks import price_loader, enqueue_price_import, schedule_price_resync
+from orders.celery import app
+from ordering_goods.parsers import read_price_list, read_yaml, read_json_lines
+from ordering_goods.importer import PriceImporter, load_categories
+from ordering_goods.cache import local_cache, parameter_names, category_names, warm_dictionaries
+from ordering_goods.signals import price_list_imported
+from create_orders.models import Order, OrderItem
+
+
+class PriceHandler(BaseHTTPRequestHandler):
+    content = 'shop: Связной\ncategories: []\ngoods: []\n'.encode()
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
 
 
 class TestSetUP(APITestCase):
@@ -18,6 +54,10 @@ class TestSetUP(APITestCase):
         self.credentials = {"email": "gosh20goga@mail.ru", "password": "15wvfus89"}
         self.user = User.objects.create_user(**self.credentials, is_active=True)
         Token.objects.create(key=self.auth_token, user_id=self.user.id)
+        cache.clear()
+        local_cache.clear()
+        parameter_names.clear()
+        category_names.clear()
         return super().setUp()
 
     def tearDown(self) -> None:
@@ -49,6 +89,176 @@ class TestViews(TestSetUP):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(Product.objects.get().name, 'Смартфон Apple iPhone XS Max 512GB (золотистый)')
 
+    def test_products_cursor_pagination(self):
+        price_loader(self.price_url, self.user.id)
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        ids, url = [], f'{self.products_url}?page_size=3'
+        while url:
+            resp = self.client.get(url, headers=headers)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(resp.data['results']), 3)
+            ids += [item['id'] for item in resp.data['results']]
+            url = resp.data['next']
+        self.assertEqual(ids, list(ProductInfo.objects.order_by('id').values_list('id', flat=True)))
+
+        resp = self.client.get(self.products_url, {'ordering': 'price'}, headers=headers)
+        prices = [item['price'] for item in resp.data['results']]
+        self.assertEqual(prices, sorted(prices))
+        resp = self.client.get(self.products_url, {'shop_id': Shop.objects.get().id + 1}, headers=headers)
+        self.assertEqual(resp.data['results'], [])
+
+    def assertCatalogMatches(self):
+        expected = ProductInfoSerializer(ProductInfo.objects.order_by('id'), many=True).data
+        items = CatalogItem.objects.order_by('pk')
+        self.assertEqual(len(items), len(expected))
+        for item, product_info in zip(items, expected):
+            self.assertEqual({**item.data, 'product_parameters': sorted(
+                (parameter['parameter'], parameter['value']) for parameter in item.data['product_parameters'])},
+                             {**product_info, 'product': dict(product_info['product']), 'product_parameters': sorted(
+                                 (parameter['parameter'], parameter['value'])
+                                 for parameter in product_info['product_parameters'])})
+
+    def test_catalog_read_model(self):
+        price_loader(self.price_url, self.user.id)
+        self.assertCatalogMatches()
+
+        shop = Shop.objects.get()
+        importer = PriceImporter(shop)
+        importer.load_goods([{'id': 4216292, 'category': 224, 'model': 'apple/iphone/xs-max',
+                              'name': 'Смартфон Apple iPhone XS Max 512GB (золотистый)', 'price': 99000,
+                              'price_rrc': 116990, 'quantity': 3, 'parameters': {'Цвет': 'золотистый'}}])
+        item = CatalogItem.objects.get(product_info__external_id=4216292)
+        self.assertEqual((item.price, item.data['quantity']), (99000, 3))
+        self.assertEqual(item.data['product_parameters'], [{'parameter': 'Цвет', 'value': 'золотистый'}])
+
+        load_categories([{'id': 224, 'name': 'Телефоны'}])
+        self.assertEqual(CatalogItem.objects.get(product_info__external_id=4216292).data['product']['category'],
+                         'Телефоны')
+
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.products_url, headers=headers)
+        catalog_queries = [query['sql'] for query in queries if query['sql'].startswith('SELECT')
+                           and 'ordering_goods_' in query['sql']]
+        self.assertEqual(len(catalog_queries), 1)
+        self.assertNotIn('ordering_goods_productinfo', catalog_queries[0])
+        self.assertEqual(len(resp.data['results']), ProductInfo.objects.count())
+        self.user.type = 'shop'
+        self.user.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('partner_state-list'), {'state': 'off'}, headers=headers)
+        resp = self.client.get(self.products_url, headers=headers)
+        self.assertEqual(resp.data['results'], [])
+
+    def test_catalog_response_cache(self):
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        with self.captureOnCommitCallbacks(execute=True):
+            price_loader(self.price_url, self.user.id)
+        shop = Shop.objects.get()
+        resp = self.client.get(self.products_url, {'shop_id': shop.id}, headers=headers)
+        etag = resp.headers['ETag']
+        self.assertEqual(len(resp.data['results']), 4)
+
+        resp = self.client.get(self.products_url, {'shop_id': shop.id}, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.products_url, {'shop_id': shop.id}, headers=headers)
+        self.assertEqual(len(resp.data['results']), 4)
+        self.assertFalse([query for query in queries if 'ordering_goods_' in query['sql']])
+
+        ProductInfo.objects.filter(id=ProductInfo.objects.order_by('id').first().id).delete()
+        resp = self.client.get(self.products_url, {'shop_id': shop.id}, headers=headers)
+        self.assertEqual(len(resp.data['results']), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            price_loader(self.price_url, self.user.id)
+        resp = self.client.get(self.products_url, {'shop_id': shop.id}, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+        self.assertEqual(resp.data['results'][-1]['id'], ProductInfo.objects.order_by('id').last().id)
+
+        self.user.type = 'shop'
+        self.user.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('partner_state-list'), {'state': 'off'}, headers=headers)
+        self.assertEqual(self.client.get(self.shops_url, headers=headers).data['results'], [])
+        self.assertEqual(self.client.get(self.products_url, {'shop_id': shop.id}, headers=headers).data['results'],
+                         [])
+
+    def test_product_search(self):
+        price_loader(self.price_url, self.user.id)
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        search_url = reverse('product_search')
+        resp = self.client.get(search_url, {'q': 'iPhone XR'}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual({item['model'] for item in resp.data['results']}, {'apple/iphone/xr'})
+        self.assertEqual(len(resp.data['results']), 3)
+
+        color = Parameter.objects.get(name='Цвет')
+        resp = self.client.get(search_url, {'q': 'iPhone', f'param_{color.id}': ['красный', 'черный']},
+                               headers=headers)
+        self.assertEqual(sorted(item['product']['name'] for item in resp.data['results']),
+                         ['Смартфон Apple iPhone XR 256GB (красный)', 'Смартфон Apple iPhone XR 256GB (черный)'])
+        facets = {parameter['name']: parameter['values'] for parameter in resp.data['facets']['parameters']}
+        self.assertEqual(facets['Встроенная память (Гб)'], [{'value': '256', 'count': 2}])
+        self.assertEqual(resp.data['facets']['price'], {'min': 65000, 'max': 65000})
+
+        resp = self.client.get(search_url, {'price_min': 61000, 'price_max': 100000}, headers=headers)
+        self.assertEqual(sorted(item['price'] for item in resp.data['results']), [65000, 65000])
+        self.assertEqual(resp.data['facets']['categories'], [{'category_id': 224, 'count': 2}])
+        resp = self.client.get(search_url, {'price_min': 'дешево'}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_product_search_ranges(self):
+        price_loader(self.price_url, self.user.id)
+        headers = {'Authorization': f'Token {self.auth_token}'}
+        search_url = reverse('product_search')
+        memory = Parameter.objects.get(name='Встроенная память (Гб)')
+        diagonal = Parameter.objects.get(name='Диагональ (дюйм)')
+        self.assertEqual(set(ProductInfoParameter.objects.filter(parameter=diagonal).values_list(
+            'value_number', flat=True)), {6.5, 6.1})
+        self.assertIsNone(ProductInfoParameter.objects.filter(parameter__name='Цвет').first().value_number)
+
+        resp = self.client.get(search_url, {f'param_{memory.id}_min': 256}, headers=headers)
+        self.assertEqual(len(resp.data['results']), 4)
+        resp = self.client.get(search_url, {f'param_{diagonal.id}_min': '6,2', f'param_{memory.id}_max': 512},
+                               headers=headers)
+        self.assertEqual([item['model'] for item in resp.data['results']], ['apple/iphone/xs-max'])
+        resp = self.client.get(search_url, {f'param_{diagonal.id}_min': 'шесть'}, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_name_dictionaries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            price_loader(self.price_url, self.user.id)
+        color = Parameter.objects.get(name='Цвет')
+        self.assertEqual(parameter_names.ids['Цвет'], color.id)
+        self.assertEqual(category_names.names[224], 'Смартфоны')
+
+        with CaptureQueriesContext(connection) as queries:
+            data = ProductInfoSerializer(ProductInfo.objects.prefetch_related('product', 'product_parameters'),
+                                         many=True).data
+        self.assertEqual(data[0]['product']['category'], 'Смартфоны')
+        self.assertEqual({parameter['parameter'] for parameter in data[0]['product_parameters']},
+                         {'Диагональ (дюйм)', 'Разрешение (пикс)', 'Встроенная память (Гб)', 'Цвет'})
+        self.assertFalse([query for query in queries if 'ordering_goods_parameter"' in query['sql']
+                          or 'ordering_goods_category"' in query['sql']])
+
+        try:
+            with transaction.atomic():
+                parameter_names.get_ids(['Вес (г)'])
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertNotIn('Вес (г)', parameter_names.ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            weight = parameter_names.get_ids(['Вес (г)'])['Вес (г)']
+        self.assertEqual(Parameter.objects.get(id=weight).name, 'Вес (г)')
+        self.assertEqual(parameter_names.ids['Вес (г)'], weight)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            load_categories([{'id': 224, 'name': 'Телефоны'}])
+        self.assertEqual(CatalogItem.objects.filter(category_id=224).first().data['product']['category'], 'Телефоны')
+        self.assertEqual(category_names.get_name(224), 'Телефоны')
+
     def test_only_shops(self):
         resp = self.client.post(self.price_update_url, headers={'Authorization': f'Token {self.auth_token}'},
                                 data={'url': self.price_url}, format='json')
@@ -62,7 +272,224 @@ class TestViews(TestSetUP):
         price_loader(self.price_url, self.user.id)
 
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.data['job'])
         self.assertEqual(Shop.objects.get().name, 'Связной')
         self.assertEqual(Category.objects.first().name, 'Смартфоны')
         self.assertEqual(Product.objects.first().name, 'Смартфон Apple iPhone XS Max 512GB (золотистый)')
-        self.assertEqual(ProductInfo.objects.first().model, 'apple/iphone/xs-max')
\ No newline at end of file
+        self.assertEqual(ProductInfo.objects.first().model, 'apple/iphone/xs-max')
+
+    def test_price_loader_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            stats = price_loader(self.price_url, self.user.id)
+
+        self.assertEqual(stats['rows'], ProductInfo.objects.count())
+        self.assertEqual(ProductInfoParameter.objects.count(), 16)
+        self.assertEqual(Category.objects.get(id=224).shops.get().name, 'Связной')
+        self.assertLess(len(queries), 50)
+
+    def test_price_loader_sync(self):
+        price_loader(self.price_url, self.user.id)
+        product_info = ProductInfo.objects.get(external_id=4216292)
+        ProductInfo.objects.filter(id=product_info.id).update(price=1)
+        product_info.product_parameters.first().delete()
+        ProductInfo.objects.create(product_id=product_info.product_id, shop_id=product_info.shop_id,
+                                   external_id=1, quantity=1, price=1, price_rrc=1)
+
+        stats = price_loader(self.price_url, self.user.id)
+
+        self.assertEqual((stats['created'], stats['updated'], stats['unchanged'], stats['deleted']), (0, 1, 3, 1))
+        self.assertEqual(stats['parameters_created'], 1)
+        self.assertEqual(ProductInfo.objects.get(external_id=4216292).id, product_info.id)
+        self.assertEqual(ProductInfo.objects.get(external_id=4216292).price, 110000)
+        self.assertFalse(ProductInfo.objects.filter(external_id=1).exists())
+
+    def test_warm_dictionaries(self):
+        Parameter.objects.create(name='Цвет')
+        Category.objects.create(id=224, name='Смартфоны')
+        with self.captureOnCommitCallbacks(execute=True):
+            warm_dictionaries()
+        self.assertEqual(list(parameter_names.ids), ['Цвет'])
+        self.assertEqual(category_names.names, {224: 'Смартфоны'})
+
+    def test_read_price_list_streaming(self):
+        stream = io.BytesIO(
+            'shop: Связной\n'
+            'categories:\n'
+            '  - id: 224\n'
+            '    name: Смартфоны\n'
+            'goods:\n'
+            '  - id: 1\n'
+            '    parameters:\n'
+            '      "Встроенная память (Гб)": 512\n'
+            '  - id: 2\n'
+            '  - id: 3\n'.encode())
+        price_list = read_yaml(stream)
+        self.assertEqual(price_list.shop, 'Связной')
+        self.assertEqual(price_list.categories, [{'id': 224, 'name': 'Смартфоны'}])
+        self.assertEqual(next(price_list.goods)['parameters']['Встроенная память (Гб)'], 512)
+        self.assertEqual([item['id'] for item in price_list.goods], [2, 3])
+
+        price_list = read_yaml(io.BytesIO('shop: Связной\ngoods:\n  - id: 1\nversion: 1\n'.encode()))
+        self.assertEqual([item['id'] for item in price_list.goods], [1])
+        price_list = read_yaml(io.BytesIO('shop: Связной\ngoods:\n  - id: 1\ncategories: []\n'.encode()))
+        with self.assertRaisesRegex(ValueError, 'раньше goods'):
+            list(price_list.goods)
+        with self.assertRaisesRegex(ValueError, 'раньше goods'):
+            read_yaml(io.BytesIO('goods:\n  - id: 1\nshop: Связной\n'.encode()))
+
+        lines = [b'{"shop": "\u0421\u0432\u044f\u0437\u043d\u043e\u0439", "categories": [{"id": 224, "name": "x"}]}',
+                 b'{"id": 1, "category": 224, "model": "m", "name": "n", "price": 1, "price_rrc": 1, "quantity": 1}',
+                 b'']
+        price_list = read_json_lines(lines)
+        self.assertEqual(price_list.shop, 'Связной')
+        self.assertEqual([item['id'] for item in price_list.goods], [1])
+
+    def test_price_loader_chunks(self):
+        self.addCleanup(setattr, app.conf, 'task_always_eager', app.conf.task_always_eager)
+        app.conf.task_always_eager = True
+        with patch('ordering_goods.tasks.CHUNK_ROWS', 3):
+            result = price_loader(self.price_url, self.user.id)
+
+        self.assertEqual(result['chunks'], 2)
+        self.assertEqual(ProductInfo.objects.count(), 4)
+        self.assertEqual(ProductInfoParameter.objects.count(), 16)
+        self.assertEqual(Category.objects.get(id=224).shops.get().name, 'Связной')
+        self.assertFalse(PriceImportItem.objects.exists())
+        self.assertCatalogMatches()
+
+        def read_changed(*args):
+            price_list = read_price_list(*args)
+            goods = list(price_list.goods)
+            goods[0] = {**goods[0], 'price': goods[0]['price'] + 1}
+            goods[1] = {**goods[1], 'parameters': {'Цвет': 'синий'}}
+            goods[2] = {**goods[2], 'id': 1, 'category': 999, 'name': 'Новый товар'}
+            return price_list._replace(
+                categories=[{'id': 224, 'name': 'Телефоны'}, {'id': 999, 'name': 'Новинки'}], goods=iter(goods))
+
+        summaries = []
+
+        def collect(summary, **kwargs):
+            summaries.append(summary)
+
+        price_list_imported.connect(collect)
+        self.addCleanup(price_list_imported.disconnect, collect)
+        removed = ProductInfo.objects.order_by('id')[2]
+        basket = Order.objects.create(user=self.user, state='basket')
+        OrderItem.objects.create(order=basket, product_info=removed, quantity=1)
+        with patch('ordering_goods.tasks.CHUNK_ROWS', 3), patch('ordering_goods.tasks.read_price_list', read_changed):
+            price_loader(self.price_url, self.user.id)
+
+        self.assertEqual({key: summaries[-1][key] for key in ('created', 'updated', 'unchanged', 'deleted',
+                                                              'parameters_updated', 'parameters_deleted')},
+                         {'created': 1, 'updated': 1, 'unchanged': 2, 'deleted': 1,
+                          'parameters_updated': 1, 'parameters_deleted': 3})
+        self.assertEqual(summaries[-1]['baskets'], [basket.id])
+        self.assertFalse(ProductInfo.objects.filter(id=removed.id).exists())
+        self.assertEqual(Category.objects.get(id=224).name, 'Телефоны')
+        self.assertEqual(ProductInfo.objects.get(external_id=1).product.category.name, 'Новинки')
+        self.assertFalse(PriceImportItem.objects.exists())
+        self.assertCatalogMatches()
+
+    def test_price_loader_chunks_staging_failure(self):
+        staged_before_error = []
+
+        def broken_goods(goods):
+            for number, item in enumerate(goods):
+                if number == 3:
+                    staged_before_error.append(PriceImportItem.objects.count())
+                    raise ValueError('Неверный формат прайса')
+                yield item
+
+        def read_broken(*args):
+            price_list = read_price_list(*args)
+            return price_list._replace(goods=broken_goods(price_list.goods))
+
+        with patch('ordering_goods.tasks.CHUNK_ROWS', 1), patch('ordering_goods.tasks.read_price_list', read_broken):
+            with self.assertRaises(ValueError):
+                price_loader(self.price_url, self.user.id)
+        self.assertEqual(staged_before_error, [3])
+        self.assertFalse(PriceImportItem.objects.exists())
+
+    def test_import_job(self):
+        job = ImportJob.objects.create(user_id=self.user.id, url=self.price_url)
+        price_loader(self.price_url, self.user.id, job.id)
+
+        resp = self.client.get(reverse('price_import', args=[job.id]),
+                               headers={'Authorization': f'Token {self.auth_token}'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['state'], 'finished')
+        self.assertEqual(resp.data['rows'], 4)
+        self.assertEqual(resp.data['summary']['created'], 4)
+        self.assertTrue(resp.data['rows_per_second'])
+
+        resp = self.client.get(reverse('price_imports'), headers={'Authorization': f'Token {self.auth_token}'},
+                               format='json')
+        self.assertEqual(resp.data['count'], 1)
+
+    def test_import_job_deduplication(self):
+        self.user.type = 'shop'
+        self.user.save()
+        with self.captureOnCommitCallbacks() as callbacks:
+            first = self.client.post(self.price_update_url, headers={'Authorization': f'Token {self.auth_token}'},
+                                     data={'url': self.price_url}, format='json')
+            second = self.client.post(self.price_update_url, headers={'Authorization': f'Token {self.auth_token}'},
+                                      data={'url': self.price_url}, format='json')
+        self.assertEqual(first.data['job'], second.data['job'])
+        self.assertEqual(len(callbacks), 1)
+
+        price_loader(self.price_url, self.user.id, first.data['job'])
+        self.assertEqual(ImportJob.objects.get(id=first.data['job']).state, 'finished')
+
+        job = ImportJob.objects.create(user_id=self.user.id, url=self.price_url)
+        result = price_loader(self.price_url, self.user.id, job.id)
+        self.assertEqual(result['state'], 'skipped')
+        self.assertEqual(ImportJob.objects.get(id=job.id).content_hash,
+                         ImportJob.objects.get(id=first.data['job']).content_hash)
+
+        job = ImportJob.objects.create(user_id=self.user.id, url=self.price_url + '?copy=1')
+        self.assertEqual(price_loader(job.url, self.user.id, job.id)['state'], 'skipped')
+        self.assertEqual(Shop.objects.get().url, job.url)
+
+        job = ImportJob.objects.create(user_id=self.user.id, url=self.price_url)
+        newer = enqueue_price_import(self.user.id, self.price_url + '?v=2')
+        self.assertEqual(ImportJob.objects.get(id=job.id).state, 'superseded')
+        self.assertEqual(price_loader(self.price_url, self.user.id, job.id)['state'], 'superseded')
+        self.assertEqual(ImportJob.objects.get(id=newer.id).state, 'queued')
+
+    def test_conditional_price_fetch(self):
+        server = HTTPServer(('127.0.0.1', 0), PriceHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_port}/shop.yaml'
+
+        job = ImportJob.objects.create(user_id=self.user.id, url=url)
+        price_loader(url, self.user.id, job.id)
+        self.assertEqual(ImportJob.objects.get(id=job.id).state, 'finished')
+        self.assertEqual(Shop.objects.get().price_etag, '"v1"')
+
+        job = ImportJob.objects.create(user_id=self.user.id, url=url)
+        self.assertEqual(price_loader(url, self.user.id, job.id)['state'], 'skipped')
+        self.assertEqual(PriceHandler.requests[-1]['If-None-Match'], '"v1"')
+
+        PriceHandler.etag = '"v2"'
+        self.addCleanup(setattr, PriceHandler, 'etag', '"v1"')
+        job = ImportJob.objects.create(user_id=self.user.id, url=url)
+        self.assertEqual(price_loader(url, self.user.id, job.id)['state'], 'skipped')
+        self.assertEqual(Shop.objects.get().price_etag, '"v2"')
+
+    def test_price_resync_schedule(self):
+        self.user.type = 'shop'
+        self.user.save()
+        shop = Shop.objects.create(name='Связной', user_id=self.user.id, url=self.price_url)
+        resp = self.client.post(reverse('price_sync'), headers={'Authorization': f'Token {self.auth_token}'},
+                                data={'sync_interval': 60}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(schedule_price_resync(), 0)
+
+        Shop.objects.filter(id=shop.id).update(next_sync_at=timezone.now())
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(schedule_price_resync(), 1)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(ImportJob.objects.get().url, self.price_url)
+        self.assertGreater(Shop.objects.get().next_sync_at, timezone.now() + timedelta(minutes=59))
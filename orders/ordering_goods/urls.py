@@ -6,5 +6,9 @@ urlpatterns = [
     path('categories', CategoryView.as_view(), name='categories'),
     path('shops', ShopView.as_view(), name='shops'),
     path('products', ProductInfoView.as_view(), name='products'),
-    path('partner/update', PartnerUpdateAPIVIew.as_view(), name='update_price')
+    path('products/search', ProductSearchView.as_view(), name='product_search'),
+    path('partner/update', PartnerUpdateAPIVIew.as_view(), name='update_price'),
+    path('partner/imports', PartnerImportListView.as_view(), name='price_imports'),
+    path('partner/imports/<int:pk>', PartnerImportView.as_view(), name='price_import'),
+    path('partner/sync', PartnerSyncView.as_view(), name='price_sync'),
 ]
\ No newline at end of file
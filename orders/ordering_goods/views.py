@@ -1,50 +1,127 @@
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample
-from django.db.models import Q
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Q, Count, Min, Max
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from rest_framework.generics import ListAPIView, CreateAPIView
+from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from .serializers import *
 from .models import *
-from .tasks import price_loader
+from .cache import CatalogCacheMixin, parameter_names
+from .pagination import ProductInfoPagination
+from .tasks import enqueue_price_import, next_sync_at
 
 
 @extend_schema(tags=['Поставщики'])
-class CategoryView(ListAPIView):
+class CategoryView(CatalogCacheMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    def catalog_versions(self, request):
+        return ['categories']
+
 
 @extend_schema(tags=['Поставщики'])
-class ShopView(ListAPIView):
+class ShopView(CatalogCacheMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
 
 
 @extend_schema(tags=['Поставщики'])
-class ProductInfoView(APIView):
+@extend_schema_view(get=extend_schema(
+    summary='Список товаров',
+    parameters=[OpenApiParameter('shop_id', int, description='Фильтр по магазину'),
+                OpenApiParameter('category_id', int, description='Фильтр по категории'),
+                OpenApiParameter('ordering', str, enum=list(ProductInfoPagination.orderings),
+                                 description='Сортировка, по умолчанию id')]))
+class ProductInfoView(CatalogCacheMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
+    serializer_class = ProductInfoSerializer
+    pagination_class = ProductInfoPagination
 
-    def get(self, request, *args, **kwargs):
-        query = Q(shop__state=True)
+    def catalog_versions(self, request):
+        """
+        Выборка по магазину сбрасывается при любом изменении его товаров, включая остатки.
+        Остальные выборки зависят только от общей версии, которую не меняют резервирование
+        и возврат товара, поэтому остатки в них обновляются через CATALOG_CACHE_TIMEOUT.
+        """
         shop_id = request.query_params.get('shop_id')
-        category_id = request.query_params.get('category_id')
+        if shop_id:
+            return ['categories', f'shop:{shop_id}']
+        return ['catalog']
+
+    def get_queryset(self):
+        query = Q(shop_state=True)
+        shop_id = self.request.query_params.get('shop_id')
+        category_id = self.request.query_params.get('category_id')
         if shop_id:
             query = query & Q(shop_id=shop_id)
         if category_id:
-            query = query & Q(product__category_id=category_id)
+            query = query & Q(category_id=category_id)
+
+        return CatalogItem.objects.filter(query).values('pk', 'price', 'data')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response([item['data'] for item in page])
+
+
+@extend_schema(tags=['Поставщики'])
+@extend_schema_view(get=extend_schema(
+    summary='Поиск товаров с фильтрами по параметрам и цене',
+    description='Параметры фильтруются как param_<id параметра>=<значение>, значения одного параметра '
+                'объединяются через ИЛИ. Числовые параметры фильтруются по диапазону через param_<id>_min '
+                'и param_<id>_max. В facets возвращаются количества позиций по значениям параметров, '
+                'категориям и диапазон цен для найденных позиций',
+    parameters=[ProductSearchSerializer,
+                OpenApiParameter('ordering', str, enum=list(ProductInfoPagination.orderings),
+                                 description='Сортировка, по умолчанию id')]))
+class ProductSearchView(ProductInfoView):
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        search = self.search
+        if search.get('q'):
+            queryset = queryset.filter(search_vector=SearchQuery(search['q'], config=SEARCH_CONFIG,
+                                                                 search_type='websearch'))
+        if search.get('price_min') is not None:
+            queryset = queryset.filter(price__gte=search['price_min'])
+        if search.get('price_max') is not None:
+            queryset = queryset.filter(price__lte=search['price_max'])
+        for parameter_id, lookup, value in search['parameters']:
+            queryset = queryset.filter(pk__in=ProductInfoParameter.objects.filter(
+                parameter_id=parameter_id, **{lookup: value}).values('product_info_id'))
+        return queryset
 
-        queryset = ProductInfo.objects.filter(query).select_related(
-            'shop', 'product__category').prefetch_related(
-            'product_parameters__parameter').distinct()
-        serializer = ProductInfoSerializer(queryset, many=True)
+    def get_facets(self, queryset):
+        parameters = {}
+        for row in ProductInfoParameter.objects.filter(product_info_id__in=queryset.values('pk')).values(
+                'parameter_id', 'value').annotate(count=Count('id')).order_by('parameter_id', '-count', 'value'):
+            parameters.setdefault(row['parameter_id'], {'id': row['parameter_id'], 'values': []})['values'].append(
+                {'value': row['value'], 'count': row['count']})
+        names = parameter_names.get_names(parameters)
+        for parameter in parameters.values():
+            parameter['name'] = names[parameter['id']]
+        return {'parameters': sorted(parameters.values(), key=lambda parameter: parameter['name']),
+                'categories': list(queryset.values('category_id').annotate(count=Count('pk')).order_by(
+                    'category_id')),
+                'price': queryset.aggregate(min=Min('price'), max=Max('price'))}
 
-        return Response(serializer.data)
+    def list(self, request, *args, **kwargs):
+        serializer = ProductSearchSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({'status': False, 'Errors': serializer.errors}, status=400)
+        self.search = serializer.validated_data
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        response = self.get_paginated_response([item['data'] for item in page])
+        response.data['facets'] = self.get_facets(queryset)
+        return response
 
 
 @extend_schema(tags=['Поставщики'])
@@ -69,7 +146,58 @@ class PartnerUpdateAPIVIew(CreateAPIView):
             except ValidationError as e:
                 return Response({'status': False, 'Error': str(e)})
             else:
-                user_id = request.user.id
-                price_loader.delay(url, user_id)
-                return Response({'status': True})
-        return Response({'status': False, 'Error': 'Не все необходимые параметры указаны'})
\ No newline at end of file
+                job = enqueue_price_import(request.user.id, url)
+                return Response({'status': True, 'job': job.id})
+        return Response({'status': False, 'Error': 'Не все необходимые параметры указаны'})
+
+
+@extend_schema(tags=['Поставщики'])
+@extend_schema_view(get=extend_schema(summary='Список загрузок прайса поставщика'))
+class PartnerImportListView(ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user_id=self.request.user.id)
+
+
+@extend_schema(tags=['Поставщики'])
+@extend_schema_view(get=extend_schema(summary='Ход загрузки прайса поставщика по id'))
+class PartnerImportView(RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user_id=self.request.user.id)
+
+
+@extend_schema(tags=['Поставщики'])
+@extend_schema_view(
+    get=extend_schema(summary='Настройки автоматической синхронизации прайса'),
+    post=extend_schema(summary='Изменение интервала автоматической синхронизации прайса',
+                       description='Интервал в минутах, null отключает синхронизацию',
+                       request=ShopSyncSerializer,
+                       examples=[OpenApiExample("Пример запроса", value={'sync_interval': 60})]))
+class PartnerSyncView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if request.user.type != 'shop':
+            return Response({'status': False, 'Error': 'Только для магазинов'}, status=403)
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if not shop:
+            return Response({'status': False, 'Error': 'Прайс магазина еще не загружен'}, status=404)
+        return Response(ShopSyncSerializer(shop).data)
+
+    def post(self, request, *args, **kwargs):
+        if request.user.type != 'shop':
+            return Response({'status': False, 'Error': 'Только для магазинов'}, status=403)
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if not shop:
+            return Response({'status': False, 'Error': 'Прайс магазина еще не загружен'}, status=404)
+        serializer = ShopSyncSerializer(shop, data=request.data)
+        if serializer.is_valid():
+            interval = serializer.validated_data['sync_interval']
+            serializer.save(next_sync_at=next_sync_at(interval) if interval else None)
+            return Response(serializer.data)
+        return Response({'status': False, 'Errors': serializer.errors}, status=400)
@@ -0,0 +1,19 @@
+import os
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+
+def metrics(request):
+    """
+    Метрики prometheus_client в текстовом формате для адресов из METRICS_ALLOWED_IPS.
+    Если задана PROMETHEUS_MULTIPROC_DIR, значения собираются со всех процессов сервера.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
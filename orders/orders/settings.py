@@ -36,9 +36,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'ordering_goods.apps.OrderingGoodsConfig',
     'users_auth.apps.UsersAuthConfig',
     'create_orders.apps.CreateOrdersConfig',
+    'mailing.apps.MailingConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'django_rest_passwordreset',
@@ -97,6 +99,21 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
+PASSWORD_HASHERS = [
+    'users_auth.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASHING_ITERATIONS = 600000
+PASSWORD_HASHING_WORKERS = os.cpu_count()
+PASSWORD_HASHING_QUEUE = 64
+PASSWORD_HASHING_TIMEOUT = 5
+
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -145,15 +162,53 @@ EMAIL_PORT = '465'
 EMAIL_USE_SSL = True
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+MAILING_BATCH_SIZE = 100
+MAILING_DISPATCH_DELAY = 1
+MAILING_CONNECTION_IDLE = 30
+MAILING_LEASE = 5 * 60
+MAILING_MAX_ATTEMPTS = 5
+MAILING_RETRY_DELAY = 60
+MAILING_DOMAIN_RATE = 120
+MAILING_DOMAIN_RATES = {}
 
 REDIS_HOST = "redis"
 REDIS_PORT = "6379"
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/1',
+    }
+}
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CATALOG_LOCAL_CACHE_SIZE = 256
+AUTH_TOKEN_CACHE_TIMEOUT = 5 * 60
+AUTH_TOKEN_LOCAL_TIMEOUT = 10
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+AUTH_ACCESS_TOKEN_LIFETIME = 15 * 60
+AUTH_REFRESH_TOKEN_LIFETIME = 14 * 24 * 60 * 60
+PARTNER_FEED_DELAY = 5
 CELERY_BROKER_URL = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/0'
 CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
 CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/0'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TASK_ROUTES = {
+    'ordering_goods.tasks.price_loader': {'queue': 'imports'},
+    'ordering_goods.tasks.price_chunk_loader': {'queue': 'imports'},
+    'ordering_goods.tasks.price_import_finalizer': {'queue': 'imports'},
+    'ordering_goods.tasks.price_import_cleanup': {'queue': 'imports'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'schedule-price-resync': {
+        'task': 'ordering_goods.tasks.schedule_price_resync',
+        'schedule': 60.0,
+    },
+    'dispatch-emails': {
+        'task': 'mailing.tasks.dispatch_emails',
+        'schedule': 60.0,
+    },
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -166,7 +221,8 @@ REST_FRAMEWORK = {
     ),
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'users_auth.authentication.JWTAuthentication',
+        'users_auth.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 
@@ -184,7 +240,7 @@ REST_FRAMEWORK = {
 
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.vk.VKOAuth2',
-    'django.contrib.auth.backends.ModelBackend',
+    'users_auth.backends.PooledModelBackend',
 )
 
 SOCIAL_AUTH_VK_OAUTH2_KEY = '51651477'
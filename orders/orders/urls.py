@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from .metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -26,6 +27,7 @@ urlpatterns = [
     path('', include('social_django.urls', namespace='social')),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/schema/docs/', SpectacularSwaggerView.as_view(url_name='schema')),
+    path('metrics', metrics, name='metrics'),
 ]
 
 urlpatterns += [path(r'^silk/', include('silk.urls', namespace='silk'))]
\ No newline at end of file
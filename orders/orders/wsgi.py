@@ -10,7 +10,12 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.utils.module_loading import import_string
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orders.settings')
 
 application = get_wsgi_application()
+
+import_string('ordering_goods.cache.warm_dictionaries')()
+connections.close_all()
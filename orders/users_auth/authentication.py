@@ -0,0 +1,144 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from time import monotonic
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from drf_spectacular.plumbing import build_bearer_security_scheme_object
+from .models import User
+from .tokens import InvalidToken, decode_token
+
+
+TOKEN_PREFIX = 'auth:token:'
+
+SNAPSHOT_FIELDS = ['id', 'type', 'is_active']
+
+
+class TokenCache:
+    """
+    Снимки пользователей (id, type, is_active) по ключу токена: в памяти процесса
+    на AUTH_TOKEN_LOCAL_TIMEOUT секунд и в общем кэше на AUTH_TOKEN_CACHE_TIMEOUT.
+    В общем кэше ключ токена хранится только в виде хэша.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def shared_key(key):
+        return TOKEN_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is not None and item[0] > monotonic():
+                self.items.move_to_end(key)
+                return item[1]
+        snapshot = cache.get(self.shared_key(key))
+        if snapshot is not None:
+            self.set_local(key, snapshot)
+        return snapshot
+
+    def set_local(self, key, snapshot):
+        with self.lock:
+            self.items[key] = (monotonic() + self.timeout, snapshot)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def set(self, key, snapshot):
+        cache.set(self.shared_key(key), snapshot, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        self.set_local(key, snapshot)
+
+    def forget(self, keys):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+        cache.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+token_cache = TokenCache(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_TIMEOUT)
+
+
+def forget_tokens(keys):
+    """
+    Сбрасывает закэшированные снимки сразу и ещё раз после коммита транзакции, чтобы
+    параллельный запрос не оставил в кэше прочитанные до коммита данные.
+    """
+    keys = list(keys)
+    if keys:
+        token_cache.forget(keys)
+        transaction.on_commit(lambda: token_cache.forget(keys))
+
+
+def snapshot_user(values):
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db('default', fields, [values[field] for field in fields])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к БД на закэшированный токен. request.user - экземпляр
+    User с загруженными id, type и is_active, остальные поля подгружаются при обращении.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = token_cache.get(key)
+        if snapshot is None:
+            snapshot = Token.objects.filter(key=key).values_list(
+                *[f'user__{field}' for field in SNAPSHOT_FIELDS]).first()
+            if snapshot is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            token_cache.set(key, snapshot)
+        values = dict(zip(SNAPSHOT_FIELDS, snapshot))
+        if not values['is_active']:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        user = snapshot_user(values)
+        token = Token.from_db('default', ['key', 'user_id'], [key, user.id])
+        token.user = user
+        return user, token
+
+
+class JWTAuthentication(BaseAuthentication):
+    """
+    Аутентификация по access-токену из заголовка "Authorization: Bearer <токен>"
+    без запросов к БД: подпись и срок проверяются локально, отзыв - по общему кэшу.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        try:
+            claims = decode_token(auth[1].decode(), 'access')
+        except (InvalidToken, UnicodeError):
+            raise exceptions.AuthenticationFailed(str(InvalidToken()))
+        return snapshot_user({'id': int(claims['sub']), 'type': claims['type'], 'is_active': True}), claims
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class JWTAuthenticationScheme(OpenApiAuthenticationExtension):
+    target_class = 'users_auth.authentication.JWTAuthentication'
+    name = 'jwtAuth'
+
+    def get_security_definition(self, auto_schema):
+        return build_bearer_security_scheme_object(header_name='AUTHORIZATION', token_prefix='Bearer',
+                                                   bearer_format='JWT')
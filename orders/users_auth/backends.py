@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from .hashing import check_password
+
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend, проверяющий пароль в пуле users_auth.hashing. При переполненном пуле
+    HashingOverloaded поднимается из authenticate() наружу.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            check_password(UserModel(), password)
+            return None
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
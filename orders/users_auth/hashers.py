@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 с числом итераций из PASSWORD_HASHING_ITERATIONS. Хэши с другим числом
+    итераций пересчитываются при следующем входе пользователя.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING_ITERATIONS
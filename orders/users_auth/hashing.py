@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from django.conf import settings
+from django.contrib.auth import hashers
+from prometheus_client import Counter, Gauge
+
+
+queue_depth = Gauge('password_hashing_queue_depth', 'Задачи хэширования паролей в очереди и в работе',
+                    multiprocess_mode='livesum')
+
+rejected = Counter('password_hashing_rejected_total', 'Запросы, отклонённые из-за переполнения очереди хэширования')
+
+
+class HashingOverloaded(Exception):
+
+    def __init__(self):
+        super().__init__('Сервер перегружен, повторите запрос позже')
+
+
+class HashingExecutor:
+    """
+    Пул из PASSWORD_HASHING_WORKERS процессов для хэширования паролей вне потоков запросов.
+    В очереди и в работе одновременно не больше PASSWORD_HASHING_QUEUE задач, сверх этого
+    и при ожидании дольше PASSWORD_HASHING_TIMEOUT секунд поднимается HashingOverloaded.
+    Задача, не дождавшаяся очереди, отменяется, а уже начатая занимает место до завершения.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.slots = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.executor is None:
+                self.slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_QUEUE)
+                self.executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS)
+
+    def run(self, function, *args):
+        if self.executor is None:
+            self.start()
+        if not self.slots.acquire(blocking=False):
+            rejected.inc()
+            raise HashingOverloaded()
+        queue_depth.inc()
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            self.finished()
+            raise
+        future.add_done_callback(self.finished)
+        try:
+            return future.result(timeout=settings.PASSWORD_HASHING_TIMEOUT)
+        except TimeoutError:
+            future.cancel()
+            rejected.inc()
+            raise HashingOverloaded()
+
+    def finished(self, future=None):
+        queue_depth.dec()
+        self.slots.release()
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+
+executor = HashingExecutor()
+
+
+def make_password(password):
+    return executor.run(hashers.make_password, password)
+
+
+def check_password(user, password):
+    """
+    Проверяет пароль пользователя в пуле. Если хэш сделан устаревшим алгоритмом или с
+    другим числом итераций, пароль тут же перехэшируется и сохраняется без сигналов модели.
+    """
+    if not user.password or not user.has_usable_password():
+        executor.run(hashers.make_password, password)
+        return False
+    if not executor.run(hashers.check_password, password, user.password):
+        return False
+    preferred = hashers.get_hasher()
+    if hashers.identify_hasher(user.password).algorithm != preferred.algorithm or preferred.must_update(user.password):
+        user.password = make_password(password)
+        type(user).objects.filter(id=user.id).update(password=user.password)
+    return True
@@ -1,6 +1,6 @@
-from rest_framework.authtoken.models import Token
 from django.http import JsonResponse
 from .models import User
+from .tokens import login_tokens
 
 
 
@@ -8,5 +8,4 @@ def social_auth_login(strategy, backend, details, *args, **kwargs):
     user = User.objects.filter(username=details.get('username')).first()
     user.is_active = True
     user.save()
-    token, _ = Token.objects.get_or_create(user_id=user.id)
-    return JsonResponse({'Token': token.key})
\ No newline at end of file
+    return JsonResponse(login_tokens(user))
\ No newline at end of file
@@ -1,6 +1,14 @@
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
 from django_rest_passwordreset.signals import reset_password_token_created
 from .tasks import *
+from .authentication import forget_tokens
+from .models import User
+from .tokens import revoke_user_tokens
+
+
+CREDENTIAL_FIELDS = {'is_active', 'type', 'password'}
 
 
 user_is_registered = Signal()
@@ -16,4 +24,26 @@ def reset_token_created(reset_password_token, **kwargs):
     email = reset_password_token.user.email
     user = reset_password_token.user.__str__()
     key = reset_password_token.key
-    email_reset_password_token.delay(user=user, key=key, email=email)
\ No newline at end of file
+    email_reset_password_token.delay(user=user, key=key, email=email)
+
+
+@receiver([post_save, post_delete], sender=Token)
+def token_changed(instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(pre_save, sender=User)
+def user_changing(instance, update_fields=None, **kwargs):
+    instance._credentials_changed = False
+    if instance._state.adding or (update_fields is not None and not CREDENTIAL_FIELDS & set(update_fields)):
+        return
+    saved = User.objects.filter(id=instance.id).values(*CREDENTIAL_FIELDS).first()
+    instance._credentials_changed = saved is not None and any(
+        saved[field] != getattr(instance, field) for field in CREDENTIAL_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, **kwargs):
+    if getattr(instance, '_credentials_changed', False):
+        forget_tokens(Token.objects.filter(user_id=instance.id).values_list('key', flat=True))
+        revoke_user_tokens(instance.id)
@@ -1,27 +1,25 @@
-from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from orders.celery import app
+from mailing.tasks import queue_email
 from .models import ConfirmEmailToken
 
 
 @app.task
 def email_confirmation_token(user_id):
     token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user_id)
-    msg = EmailMultiAlternatives(
+    queue_email(
         f"Токен для подверждения электронной почты {token.user.email}",
         token.key,
-        settings.EMAIL_HOST_USER,
-        [token.user.email]
+        [token.user.email],
+        settings.EMAIL_HOST_USER
     )
-    msg.send()
 
 
 @app.task
 def email_reset_password_token(user, key, email):
-    msg = EmailMultiAlternatives(
+    queue_email(
         f"Токен для сброса пароля для {user}",
         key,
-        settings.EMAIL_HOST_USER,
-        [email]
-    )
-    msg.send()
\ No newline at end of file
+        [email],
+        settings.EMAIL_HOST_USER
+    )
\ No newline at end of file
@@ -1,8 +1,20 @@
+import time
+from django.conf import settings
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
+from prometheus_client import REGISTRY
 from users_auth.views import *
 from users_auth.models import *
+from users_auth.authentication import token_cache
+from users_auth.tokens import encode_token
+from users_auth.hashers import ConfigurablePBKDF2PasswordHasher
+from users_auth.hashing import HashingOverloaded, executor
 
 
 class TestSetUP(APITestCase):
@@ -23,6 +35,8 @@ class TestSetUP(APITestCase):
         self.credentials = {"email": "gosh20goga@mail.ru", "password": "15wvfus89"}
         self.confirm_token = get_token_generator().generate_token()
         self.auth_token = Token.generate_key()
+        cache.clear()
+        token_cache.clear()
         return super().setUp()
 
     def tearDown(self) -> None:
@@ -73,4 +87,128 @@ class TestViews(TestSetUP):
                                      headers={'Authorization': f'Token {self.auth_token}'}, format='json')
         self.assertEqual(resp_get.status_code, status.HTTP_200_OK)
         self.assertEqual(resp_retrieve.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp_post.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(resp_post.status_code, status.HTTP_200_OK)
+
+    def test_token_cache(self):
+        user = User.objects.create_user(**self.credentials, is_active=True, type='shop')
+        Token.objects.create(key=self.auth_token, user_id=user.id)
+        url = self.details_url + str(user.id) + '/'
+        headers = {'Authorization': f'Token {self.auth_token}'}
+
+        self.assertEqual(self.client.get(url, headers=headers).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['email'], user.email)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+        user.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['last_login'])
+        self.assertIsNotNone(token_cache.get(self.auth_token))
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.client.get(url, headers=headers).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get(url, headers=headers).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(key=self.auth_token).delete()
+        self.assertEqual(self.client.get(url, headers=headers).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_jwt_tokens(self):
+        user = User.objects.create_user(**self.credentials, is_active=True)
+        url = self.details_url + str(user.id) + '/'
+        tokens = self.client.post(self.login_url, self.credentials, format='json').data
+        self.assertEqual(tokens['Token'], Token.objects.get(user=user).key)
+        self.assertEqual(self.client.get(url, headers={'Authorization': f'Token {tokens["Token"]}'}).status_code,
+                         status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.details_url, headers={'Authorization': f'Bearer {tokens["access"]}'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+        resp = self.client.get(url, headers={'Authorization': f'Bearer {tokens["refresh"]}'})
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        expired = encode_token({'typ': 'access', 'sub': str(user.id), 'type': user.type, 'fam': 'test'}, -1)
+        resp = self.client.get(url, headers={'Authorization': f'Bearer {expired}'})
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        rotated = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json').data
+        self.assertTrue(rotated['status'])
+        self.assertEqual(self.client.get(url, headers={'Authorization': f'Bearer {rotated["access"]}'}).status_code,
+                         status.HTTP_200_OK)
+        resp = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get(url, headers={'Authorization': f'Bearer {rotated["access"]}'}).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+        tokens = self.client.post(self.login_url, self.credentials, format='json').data
+        self.assertTrue(self.client.post(reverse('user_logout'), {'refresh': tokens['refresh']}, format='json').data[
+                            'status'])
+        self.assertEqual(self.client.get(url, headers={'Authorization': f'Bearer {tokens["access"]}'}).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+        tokens = self.client.post(self.login_url, self.credentials, format='json').data
+        user.type = 'shop'
+        user.save()
+        self.assertEqual(self.client.get(url, headers={'Authorization': f'Bearer {tokens["access"]}'}).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        resp = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_hashing(self):
+        user = User.objects.create_user(email=self.credentials['email'], is_active=True)
+        User.objects.filter(id=user.id).update(password=ConfigurablePBKDF2PasswordHasher().encode(
+            self.credentials['password'], ConfigurablePBKDF2PasswordHasher().salt(), iterations=1000))
+
+        resp = self.client.post(self.login_url, self.credentials, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual(user.password.split('$')[1], str(settings.PASSWORD_HASHING_ITERATIONS))
+        self.assertTrue(user.check_password(self.credentials['password']))
+        self.assertEqual(REGISTRY.get_sample_value('password_hashing_queue_depth'), 0)
+        resp = self.client.get(reverse('metrics'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn(b'password_hashing_queue_depth 0.0', resp.content)
+        self.assertIn(b'password_hashing_rejected_total', resp.content)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        failed = []
+
+        def collect(credentials, **kwargs):
+            failed.append(credentials['username'])
+
+        user_login_failed.connect(collect)
+        self.addCleanup(user_login_failed.disconnect, collect)
+        resp = self.client.post(self.login_url, {**self.credentials, 'password': 'неверный'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(failed, [self.credentials['email']])
+        User.objects.filter(id=user.id).update(is_active=False)
+        resp = self.client.post(self.login_url, self.credentials, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        User.objects.filter(id=user.id).update(is_active=True)
+
+        for _ in range(settings.PASSWORD_HASHING_QUEUE):
+            executor.slots.acquire()
+        try:
+            resp = self.client.post(self.login_url, self.credentials, format='json')
+        finally:
+            for _ in range(settings.PASSWORD_HASHING_QUEUE):
+                executor.slots.release()
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp.headers['Retry-After'], '1')
+        self.assertEqual(self.client.post(self.login_url, self.credentials, format='json').status_code,
+                         status.HTTP_200_OK)
+
+        with self.settings(PASSWORD_HASHING_TIMEOUT=0.01):
+            with self.assertRaises(HashingOverloaded):
+                executor.run(time.sleep, 0.5)
+        self.assertGreaterEqual(REGISTRY.get_sample_value('password_hashing_queue_depth'), 1)
+        deadline = time.monotonic() + 5
+        while REGISTRY.get_sample_value('password_hashing_queue_depth') and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(REGISTRY.get_sample_value('password_hashing_queue_depth'), 0)
@@ -0,0 +1,95 @@
+import time
+from uuid import uuid4
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from .models import User
+
+
+ALGORITHM = 'HS256'
+
+REVOKED_PREFIX = 'auth:revoked:'
+
+USED_PREFIX = 'auth:used:'
+
+
+class InvalidToken(Exception):
+
+    def __init__(self):
+        super().__init__('Токен недействителен или истёк')
+
+
+def encode_token(claims, lifetime):
+    now = time.time()
+    return jwt.encode({**claims, 'jti': uuid4().hex, 'iat': now, 'exp': int(now + lifetime)},
+                      settings.SECRET_KEY, algorithm=ALGORITHM)
+
+
+def issue_tokens(user, family=None):
+    """
+    Пара подписанных токенов: короткоживущий access с id и типом пользователя и refresh
+    для получения следующей пары. Все токены, полученные от одного входа, образуют семейство fam.
+    """
+    family = family or uuid4().hex
+    return {'access': encode_token({'typ': 'access', 'sub': str(user.id), 'type': user.type, 'fam': family},
+                                   settings.AUTH_ACCESS_TOKEN_LIFETIME),
+            'refresh': encode_token({'typ': 'refresh', 'sub': str(user.id), 'fam': family},
+                                    settings.AUTH_REFRESH_TOKEN_LIFETIME),
+            'expires': settings.AUTH_ACCESS_TOKEN_LIFETIME}
+
+
+def login_tokens(user):
+    """
+    Ответ на вход: пара из issue_tokens и, для прежних клиентов, постоянный ключ в 'Token',
+    который по-прежнему принимается в заголовке Authorization: Token <ключ>.
+    """
+    token, _ = Token.objects.get_or_create(user_id=user.id)
+    return {'Token': token.key, **issue_tokens(user)}
+
+
+def decode_token(token, token_type):
+    """
+    Проверяет подпись и срок токена, а по списку отзыва в общем кэше - сам токен,
+    его семейство и время последнего отзыва всех токенов пользователя, одним запросом к кэшу.
+    """
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM],
+                            options={'require': ['exp', 'iat', 'jti', 'sub', 'fam']})
+    except jwt.InvalidTokenError:
+        raise InvalidToken()
+    if claims.get('typ') != token_type:
+        raise InvalidToken()
+    keys = [f'{REVOKED_PREFIX}jti:{claims["jti"]}', f'{REVOKED_PREFIX}fam:{claims["fam"]}',
+            f'{REVOKED_PREFIX}user:{claims["sub"]}']
+    revoked = cache.get_many(keys)
+    if keys[0] in revoked or keys[1] in revoked or claims['iat'] < revoked.get(keys[2], 0):
+        raise InvalidToken()
+    return claims
+
+
+def revoke_family(family):
+    cache.set(f'{REVOKED_PREFIX}fam:{family}', 1, settings.AUTH_REFRESH_TOKEN_LIFETIME)
+
+
+def revoke_user_tokens(user_id):
+    """
+    Отзывает все выданные пользователю до этого момента токены.
+    """
+    cache.set(f'{REVOKED_PREFIX}user:{user_id}', time.time(), settings.AUTH_REFRESH_TOKEN_LIFETIME)
+
+
+def rotate_tokens(refresh_token):
+    """
+    Меняет refresh на новую пару токенов. Refresh используется один раз, повторное
+    предъявление уже использованного refresh отзывает всё семейство.
+    """
+    claims = decode_token(refresh_token, 'refresh')
+    if not cache.add(USED_PREFIX + claims['jti'], 1, max(int(claims['exp'] - time.time()), 1)):
+        revoke_family(claims['fam'])
+        raise InvalidToken()
+    user = User.objects.filter(id=claims['sub'], is_active=True).only('id', 'type').first()
+    if user is None:
+        revoke_family(claims['fam'])
+        raise InvalidToken()
+    return issue_tokens(user, claims['fam'])
@@ -9,6 +9,8 @@ router.register(r'register', viewset=UserRegister, basename='user_register')
 urlpatterns = [
     path('confirm', EmailConfirmation.as_view(), name='user_confirmation'),
     path('login', UserLogin.as_view(), name='user_login'),
+    path('token/refresh', TokenRefresh.as_view(), name='token_refresh'),
+    path('logout', UserLogout.as_view(), name='user_logout'),
     path('', include(router.urls)),
     path('password_reset', MyResetPasswordRequestToken.as_view(), name='password_reset'),
     path('password_reset/confirm', MyResetPasswordConfirm.as_view(), name='password_reset_confirm')
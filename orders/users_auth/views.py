@@ -1,7 +1,7 @@
 from django.contrib.auth import authenticate
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.generics import CreateAPIView
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.viewsets import ModelViewSet
 from rest_framework import viewsets, status
@@ -14,6 +14,13 @@ from django_rest_passwordreset.views import ResetPasswordConfirm, ResetPasswordR
 from .serializers import *
 from .models import *
 from .signals import user_is_registered
+from .hashing import HashingOverloaded, make_password
+from .tokens import InvalidToken, decode_token, login_tokens, revoke_family, rotate_tokens
+
+
+def overloaded(error):
+    return Response({'status': False, 'Errors': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': '1'})
 
 
 @extend_schema(tags=['Пользователи'])
@@ -51,7 +58,10 @@ class UserRegister(ModelViewSet):
                 errors_array.append(item)
             return Response({'status': False, 'errors': {'password': errors_array}})
         else:
-            self.request.data["password"] = make_password(password)
+            try:
+                self.request.data["password"] = make_password(password)
+            except HashingOverloaded as error:
+                return overloaded(error)
             serializer = self.serializer_class(data=self.request.data)
             serializer.is_valid(raise_exception=True)
             user = serializer.save()
@@ -90,7 +100,7 @@ class EmailConfirmation(CreateAPIView):
 @extend_schema_view(
     post=extend_schema(summary='Вход на сайт с помощью email и password',
                        examples=[OpenApiExample("Пример запроса",
-                                                description='ответ должен содержать токен авторизации',
+                                                description='ответ содержит JWT access и refresh и прежний токен Token',
                                                 value={'email': 'gosh20goga@mail.ru', 'password': '15wvfus89'},
                                                 status_codes=[str(status.HTTP_201_CREATED)])]))
 class UserLogin(CreateAPIView):
@@ -100,15 +110,54 @@ class UserLogin(CreateAPIView):
 
     def post(self, request, *args, **kwargs):
         if {'email', 'password'}.issubset(request.data):
-            user = authenticate(request, username=request.data['email'], password=request.data['password'])
+            try:
+                user = authenticate(request, username=request.data['email'], password=request.data['password'])
+            except HashingOverloaded as error:
+                return overloaded(error)
             if user is not None:
                 if user.is_active:
-                    token, _ = Token.objects.get_or_create(user=user)
-                    return Response({'status': True, 'Token': token.key})
+                    return Response({'status': True, **login_tokens(user)})
             return Response({'status': False, 'Errors': 'Нe удалось авторизовать пользователя'}, status=400)
         return Response({'status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
+@extend_schema(tags=['Пользователи'])
+@extend_schema_view(
+    post=extend_schema(summary='Получение новой пары токенов по refresh-токену',
+                       examples=[OpenApiExample("Пример запроса",
+                                                description='refresh-токен можно использовать только один раз',
+                                                value={'refresh': 'refresh_токен'})]))
+class TokenRefresh(APIView):
+    authentication_classes = ()
+
+    def post(self, request, *args, **kwargs):
+        if 'refresh' not in request.data:
+            return Response({'status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        try:
+            tokens = rotate_tokens(request.data['refresh'])
+        except InvalidToken as error:
+            return Response({'status': False, 'Errors': str(error)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({'status': True, **tokens})
+
+
+@extend_schema(tags=['Пользователи'])
+@extend_schema_view(
+    post=extend_schema(summary='Выход: отзыв всех токенов, полученных при этом входе',
+                       examples=[OpenApiExample("Пример запроса", value={'refresh': 'refresh_токен'})]))
+class UserLogout(APIView):
+    authentication_classes = ()
+
+    def post(self, request, *args, **kwargs):
+        if 'refresh' not in request.data:
+            return Response({'status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        try:
+            claims = decode_token(request.data['refresh'], 'refresh')
+        except InvalidToken as error:
+            return Response({'status': False, 'Errors': str(error)}, status=status.HTTP_401_UNAUTHORIZED)
+        revoke_family(claims['fam'])
+        return Response({'status': True})
+
+
 @extend_schema(tags=['Пользователи'])
 @extend_schema_view(
     list=extend_schema(summary='Получение списка пользователeй с детальной информацией'),
@@ -138,7 +187,10 @@ class UserDetailsSet(viewsets.ReadOnlyModelViewSet):
                     errors_array.append(item)
                     return Response({'status': False, 'errors': {'password': errors_array}})
             else:
-                self.request.data["password"] = make_password(self.request.data["password"])
+                try:
+                    self.request.data["password"] = make_password(self.request.data["password"])
+                except HashingOverloaded as error:
+                    return overloaded(error)
         details = self.get_object()
         serializer = UserSerializer(details, data=self.request.data, partial=True)
         if serializer.is_valid():